@@ -1,45 +1,103 @@
 import json
+import os
 import sys
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
 
-def main():
-    for raw in sys.stdin:
-        raw = raw.strip()
-        if not raw:
-            continue
-        try:
-            req = json.loads(raw)
-        except json.JSONDecodeError:
-            continue
-        req_id = req.get("id")
-        method = req.get("method")
-        params = req.get("params", {})
-
-        if method == "manifest":
-            result = {
-                "name": "mcp_echo",
-                "tools": [
-                    {
-                        "name": "echo",
-                        "description": "Devuelve los parametros recibidos tal cual.",
-                        "parameters": {
-                            "type": "object",
-                            "properties": {
-                                "message": {"type": "string", "description": "Mensaje a devolver"}
-                            },
-                            "required": ["message"]
-                        }
-                    }
-                ],
+
+def _loads(raw):
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def _dumps(obj) -> bytes:
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode("utf-8")
+
+
+# El manifiesto es estático: se construye una sola vez al cargar el módulo
+_MANIFEST_RESULT = {
+    "name": "mcp_echo",
+    "tools": [
+        {
+            "name": "echo",
+            "description": "Devuelve los parametros recibidos tal cual.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "message": {"type": "string", "description": "Mensaje a devolver"}
+                },
+                "required": ["message"]
             }
-        elif method == "echo":
-            result = {"echo": params}
-        else:
-            result = {"error": f"Metodo '{method}' no soportado"}
+        }
+    ],
+}
+
+# Fragmentos de respuesta pre-serializados: solo cambia el id entre peticiones
+_RESPONSE_PREFIX = b'{"jsonrpc":"2.0","id":'
+_MANIFEST_SUFFIX = b',"result":' + _dumps(_MANIFEST_RESULT) + b'}\n'
+
+
+def _handle_manifest(id_bytes: bytes, params) -> bytes:
+    return _RESPONSE_PREFIX + id_bytes + _MANIFEST_SUFFIX
+
+
+def _handle_echo(id_bytes: bytes, params) -> bytes:
+    # La forma de la respuesta es fija: serializar solo params
+    return _RESPONSE_PREFIX + id_bytes + b',"result":{"echo":' + _dumps(params) + b"}}\n"
+
+
+# Tabla de métodos soportados; cada handler devuelve la respuesta ya serializada
+_HANDLERS = {
+    "manifest": _handle_manifest,
+    "echo": _handle_echo,
+}
+
+
+def _handle_line(raw: bytes) -> bytes | None:
+    """Procesa una línea JSON-RPC y devuelve la respuesta serializada (o None)."""
+    raw = raw.strip()
+    # Descartar líneas que no pueden ser un objeto JSON sin invocar al parser
+    if not (raw.startswith(b"{") and raw.endswith(b"}")):
+        return None
+    try:
+        req = _loads(raw)
+    except ValueError:
+        return None
+    method = req.get("method")
+    id_bytes = _dumps(req.get("id"))
+
+    handler = _HANDLERS.get(method) if isinstance(method, str) else None
+    if handler:
+        return handler(id_bytes, req.get("params", {}))
+
+    error = {"error": f"Metodo '{method}' no soportado"}
+    return _RESPONSE_PREFIX + id_bytes + b',"result":' + _dumps(error) + b"}\n"
+
+
+def main():
+    # Leer en bloques: una sola llamada a read() devuelve todas las peticiones
+    # pendientes, que se responden juntas con un único flush
+    stdin_fd = sys.stdin.fileno()
+    stdout = sys.stdout.buffer
+    pending = b""
+    while True:
+        chunk = os.read(stdin_fd, 65536)
+        if not chunk:
+            break
+        *lines, pending = (pending + chunk).split(b"\n")
+        responses = [out for out in map(_handle_line, lines) if out]
+        if responses:
+            stdout.write(b"".join(responses))
+            stdout.flush()
 
-        response = {"jsonrpc": "2.0", "id": req_id, "result": result}
-        print(json.dumps(response), flush=True)
+    # Última línea sin salto de línea final
+    out = _handle_line(pending)
+    if out:
+        stdout.write(out)
+        stdout.flush()
 
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
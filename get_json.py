@@ -1,12 +1,20 @@
 import requests
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 url = "https://jsonplaceholder.typicode.com/todos/1"
 
+# Shared session: reuses the TCP/TLS connection across requests to the same host
+_session = requests.Session()
+
 try:
-    response = requests.get(url)
+    response = _session.get(url, timeout=10)
     response.raise_for_status()  # Raise an exception for bad status codes
-    data = response.json()
+    data = orjson.loads(response.content) if orjson else response.json()
     print(json.dumps(data, indent=4))
 except requests.exceptions.RequestException as e:
     print(f"Error fetching data: {e}")
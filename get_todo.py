@@ -2,7 +2,10 @@ import requests
 import json
 
 url = "https://jsonplaceholder.typicode.com/todos/1"
-response = requests.get(url)
+
+# Shared session: reuses the TCP/TLS connection across requests to the same host
+_session = requests.Session()
+response = _session.get(url, timeout=10)
 
 if response.status_code == 200:
     data = response.json()
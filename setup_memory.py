@@ -5,6 +5,7 @@ Script para configurar el sistema de memoria persistente de Bytecrafter CLI
 
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 def create_env_file():
@@ -74,13 +75,19 @@ def check_dependencies():
     
     return True
 
+@lru_cache(maxsize=1)
+def _load_env() -> bool:
+    """Carga el archivo .env una sola vez por proceso"""
+    if not Path(".env").exists():
+        return False
+    from dotenv import load_dotenv
+    return load_dotenv()
+
 def test_database_connection():
     """Prueba la conexión a la base de datos"""
     try:
         # Cargar variables de entorno
-        if Path(".env").exists():
-            from dotenv import load_dotenv
-            load_dotenv()
+        _load_env()
         
         from src.bytecrafter.memory.database import init_database, test_connection
         
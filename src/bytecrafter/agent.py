@@ -3,14 +3,7 @@ import os
 from typing import List, Dict
 
 from bytecrafter import tools
-from bytecrafter.providers import current_provider
-from bytecrafter.browser_tools import (
-    start_browser_session, navigate_browser, take_browser_screenshot, close_browser_session
-)
-from bytecrafter.task_manager import (
-    new_task, start_task_work, complete_current_task, break_down_current_task, 
-    show_task_list, show_current_task
-)
+from bytecrafter import providers
 
 # El proveedor LLM se selecciona automáticamente según las variables de entorno
 
@@ -124,59 +117,68 @@ Description: Use this tool ONLY when the user's request has been fully completed
 Usage: <attempt_completion><result>Summary of completion</result></attempt_completion>
 """
 
-# Define the tools in a format that the Gemini API understands
-GEMINI_TOOLS = [
+# All tool declarations, flattened so non-Gemini providers can introspect them
+ALL_DECLARATIONS = [
     # Herramientas básicas de archivos
-    {"function_declarations": [tools.read_file_declaration]},
-    {"function_declarations": [tools.create_file_declaration]},
-    {"function_declarations": [tools.edit_file_declaration]},
-    {"function_declarations": [tools.list_files_declaration]},
-    {"function_declarations": [tools.inspect_file_declaration]},
+    tools.read_file_declaration,
+    tools.create_file_declaration,
+    tools.edit_file_declaration,
+    tools.list_files_declaration,
+    tools.inspect_file_declaration,
     
     # Herramientas avanzadas de archivos
-    {"function_declarations": [tools.replace_in_file_declaration]},
-    {"function_declarations": [tools.search_files_declaration]},
-    {"function_declarations": [tools.list_code_definition_names_declaration]},
+    tools.replace_in_file_declaration,
+    tools.search_files_declaration,
+    tools.list_code_definition_names_declaration,
     
     # Herramientas de ejecución
-    {"function_declarations": [tools.execute_command_declaration]},
-    {"function_declarations": [tools.safe_execute_declaration]},
+    tools.execute_command_declaration,
+    tools.safe_execute_declaration,
     
     # Herramientas de búsqueda web
-    {"function_declarations": [tools.web_search_declaration]},
+    tools.web_search_declaration,
     
     # Herramientas de navegador
-    {"function_declarations": [tools.start_browser_session_declaration]},
-    {"function_declarations": [tools.navigate_browser_declaration]},
-    {"function_declarations": [tools.take_browser_screenshot_declaration]},
-    {"function_declarations": [tools.close_browser_session_declaration]},
+    tools.start_browser_session_declaration,
+    tools.navigate_browser_declaration,
+    tools.take_browser_screenshot_declaration,
+    tools.close_browser_session_declaration,
     
     # Herramientas de gestión de tareas
-    {"function_declarations": [tools.new_task_declaration]},
-    {"function_declarations": [tools.start_task_work_declaration]},
-    {"function_declarations": [tools.complete_current_task_declaration]},
-    {"function_declarations": [tools.break_down_current_task_declaration]},
-    {"function_declarations": [tools.show_task_list_declaration]},
-    {"function_declarations": [tools.show_current_task_declaration]},
+    tools.new_task_declaration,
+    tools.start_task_work_declaration,
+    tools.complete_current_task_declaration,
+    tools.break_down_current_task_declaration,
+    tools.show_task_list_declaration,
+    tools.show_current_task_declaration,
     
     # Herramientas de interacción
-    {"function_declarations": [tools.ask_followup_question_declaration]},
-    {"function_declarations": [tools.answer_user_declaration]},
+    tools.ask_followup_question_declaration,
+    tools.answer_user_declaration,
     
     # Herramientas MCP (prototipo)
-    {"function_declarations": [tools.mcp_add_server_declaration]},
-    {"function_declarations": [tools.mcp_list_servers_declaration]},
-    {"function_declarations": [tools.mcp_execute_tool_declaration]},
+    tools.mcp_add_server_declaration,
+    tools.mcp_list_servers_declaration,
+    tools.mcp_execute_tool_declaration,
 ]
 
+# Define the tools in a format that the Gemini API understands
+# (a single entry carrying every declaration)
+GEMINI_TOOLS = [{"function_declarations": ALL_DECLARATIONS}]
+
 # ---------------------------------------------------------------------------
 # LLM abstraction
 # ---------------------------------------------------------------------------
 
+# Opt-in token streaming: the response carries a `stream` iterator that main.py prints as it arrives
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "").lower() in ("1", "true", "yes")
+
 def get_llm_response(history: List[Dict[str, str]], model_name: str | None = None):
     """Send conversation history to the selected LLM provider and return the response."""
     try:
-        return current_provider.generate(history, model_name=model_name, system_instruction=SYSTEM_PROMPT)
+        return providers.current_provider.generate(
+            history, model_name=model_name, stream=STREAM_RESPONSES, system_instruction=SYSTEM_PROMPT
+        )
     except Exception as e:
         return {"error": f"LLM provider error: {e}"}
 
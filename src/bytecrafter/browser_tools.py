@@ -3,12 +3,95 @@ Herramientas de control de navegador remoto para Bytecrafter CLI.
 Similar a las funcionalidades de navegador remoto de Cline.
 """
 
+import base64
 import os
+import shutil
+import socket
 import subprocess
 import tempfile
 import time
 import json
+from collections import deque
+from pathlib import Path
 import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+def _loads(raw: bytes):
+    """Decodifica JSON desde bytes (orjson si está disponible)."""
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+def _dumps(obj) -> str:
+    """Serializa a texto JSON (los frames CDP deben ser de texto)."""
+    return orjson.dumps(obj).decode() if orjson else json.dumps(obj)
+
+# Ejecutable de Chrome resuelto en la primera sesión (se reutiliza en las siguientes)
+_CHROME_EXE: str | None = None
+
+def _find_chrome() -> str | None:
+    """Localiza el ejecutable de Chrome/Chromium y cachea el resultado."""
+    global _CHROME_EXE
+    if _CHROME_EXE:
+        return _CHROME_EXE
+    
+    # Primero los comandos en PATH (solo stat de directorios, sin lanzar procesos)
+    for name in ("google-chrome", "chromium-browser", "chromium", "chrome"):
+        _CHROME_EXE = shutil.which(name)
+        if _CHROME_EXE:
+            return _CHROME_EXE
+    
+    # Después las rutas de instalación habituales
+    chrome_paths = [
+        "/usr/bin/google-chrome",
+        "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
+        "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"
+    ]
+    _CHROME_EXE = next((path for path in chrome_paths if os.path.exists(path)), None)
+    
+    return _CHROME_EXE
+
+def _pid_alive(pid: int) -> bool:
+    """Indica si existe un proceso con ese PID."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _profile_in_use(user_data_dir: Path) -> bool:
+    """Indica si otra instancia de Chrome está usando el perfil.
+
+    Chrome no borra su bloqueo si se le mata: un SingletonLock (Linux/macOS, enlace
+    simbólico a "host-pid") cuyo proceso ya no existe se elimina, y un lockfile
+    (Windows) se puede borrar en cuanto nadie lo tiene abierto.
+    """
+    lock = user_data_dir / "SingletonLock"
+    if os.path.lexists(lock):
+        try:
+            host, _, pid = os.readlink(lock).rpartition("-")
+            if host != socket.gethostname() or _pid_alive(int(pid)):
+                return True
+        except (OSError, ValueError):
+            return True
+        for name in ("SingletonLock", "SingletonSocket", "SingletonCookie"):
+            try:
+                os.unlink(user_data_dir / name)
+            except OSError:
+                pass
+    
+    lockfile = user_data_dir / "lockfile"
+    if lockfile.exists():
+        try:
+            lockfile.unlink()
+        except OSError:
+            return True
+    return False
 
 class BrowserController:
     """Controlador para navegador Chrome via CDP."""
@@ -16,6 +99,16 @@ class BrowserController:
     def __init__(self):
         self.browser_process = None
         self.port = 9222
+        # Sesión HTTP reutilizable: mantiene viva la conexión a localhost entre llamadas CDP
+        self._session = requests.Session()
+        self._session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        # Perfil estable: Chrome conserva caché de disco, DNS y sesiones TLS entre ejecuciones
+        self.user_data_dir = Path(os.path.expanduser("~/.cache/bytecrafter/chrome_profile"))
+        # Conexión WebSocket persistente a la pestaña activa
+        self._ws = None
+        self._msg_id = 0
+        # Eventos CDP recibidos mientras se esperaban respuestas (p. ej. Page.loadEventFired)
+        self._events = deque(maxlen=256)
         
     def start_browser(self, headless: bool = True, debug_port: int = 9222) -> str:
         """Inicia Chrome con CDP habilitado."""
@@ -23,32 +116,17 @@ class BrowserController:
             self.port = debug_port
             
             # Buscar Chrome
-            chrome_paths = [
-                "google-chrome",
-                "chromium-browser", 
-                "/usr/bin/google-chrome",
-                "C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe",
-                "C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe"
-            ]
-            
-            chrome_exe = None
-            for path in chrome_paths:
-                if os.path.exists(path):
-                    chrome_exe = path
-                    break
-                # También verificar en PATH
-                try:
-                    subprocess.run([path, "--version"], capture_output=True, timeout=2)
-                    chrome_exe = path
-                    break
-                except:
-                    continue
+            chrome_exe = _find_chrome()
             
             if not chrome_exe:
                 return "❌ Chrome no encontrado. Instala Google Chrome o Chromium."
             
-            # Directorio temporal
-            user_data_dir = tempfile.mkdtemp(prefix="bytecrafter_chrome_")
+            # Reutilizar el perfil persistente salvo que otra instancia de Chrome lo esté usando
+            user_data_dir = self.user_data_dir
+            user_data_dir.mkdir(parents=True, exist_ok=True)
+            persistent_profile = not _profile_in_use(user_data_dir)
+            if not persistent_profile:
+                user_data_dir = tempfile.mkdtemp(prefix="bytecrafter_chrome_")
             
             # Argumentos de Chrome
             chrome_args = [
@@ -56,64 +134,128 @@ class BrowserController:
                 f"--remote-debugging-port={debug_port}",
                 f"--user-data-dir={user_data_dir}",
                 "--no-first-run",
-                "--disable-web-security",
                 "--disable-features=VizDisplayCompositor"
             ]
             
+            # Las cookies y sesiones del perfil persistente sobreviven entre ejecuciones:
+            # ahí no se desactiva la política de mismo origen
+            if not persistent_profile:
+                chrome_args.append("--disable-web-security")
+            
             if headless:
                 chrome_args.extend(["--headless", "--disable-gpu"])
             
-            # Iniciar Chrome
+            # Iniciar Chrome (sin pipes: nadie las lee y Chrome se bloquearía al llenarlas)
             self.browser_process = subprocess.Popen(
                 chrome_args,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
             )
             
-            # Esperar inicio
-            time.sleep(3)
+            # Esperar a que CDP responda (máx. ~5s) en lugar de una pausa fija
+            for _ in range(100):
+                if self.browser_process.poll() is not None:
+                    return f"❌ Chrome falló al iniciar. Código de salida: {self.browser_process.poll()}"
+                try:
+                    response = self._session.get(f"http://localhost:{debug_port}/json/version", timeout=0.2)
+                    if response.status_code == 200:
+                        break
+                except requests.RequestException:
+                    pass
+                time.sleep(0.05)
+            else:
+                return f"❌ No se puede conectar a CDP en puerto {debug_port}"
             
-            if self.browser_process.poll() is not None:
-                return f"❌ Chrome falló al iniciar. Código de salida: {self.browser_process.poll()}"
+            # Abrir una única conexión WebSocket a la primera pestaña para toda la sesión
+            # (solo páginas: no service workers, extensiones ni otros targets)
+            tabs_response = self._session.get(f"http://localhost:{debug_port}/json", timeout=5)
+            tabs = [
+                t for t in _loads(tabs_response.content)
+                if t.get("type") == "page" and t.get("webSocketDebuggerUrl")
+            ]
+            if not tabs:
+                return "❌ No hay pestañas disponibles"
             
-            # Verificar que CDP está funcionando
-            try:
-                response = requests.get(f"http://localhost:{debug_port}/json", timeout=5)
-                if response.status_code == 200:
-                    return f"✅ Navegador iniciado en puerto {debug_port}"
-                else:
-                    return f"❌ CDP no responde en puerto {debug_port}"
-            except:
-                return f"❌ No se puede conectar a CDP en puerto {debug_port}"
+            from websockets.sync.client import connect
+            self._ws = connect(tabs[0]["webSocketDebuggerUrl"], max_size=None)
+            self._msg_id = 0
+            self._events.clear()
+            
+            return f"✅ Navegador iniciado en puerto {debug_port}"
             
         except Exception as e:
             return f"❌ Error iniciando navegador: {e}"
     
-    def navigate_to_url(self, url: str) -> str:
-        """Navega a una URL usando CDP REST API."""
+    def send_batch(self, commands: list, timeout: float = 30) -> list:
+        """Envía varios comandos CDP seguidos y devuelve sus resultados en orden.
+        
+        `commands` es una lista de tuplas (método, parámetros). Los mensajes se
+        envían sin esperar respuesta entre ellos y las respuestas se emparejan
+        por id, así la latencia total es de un solo viaje de ida y vuelta.
+        """
+        if self._ws is None:
+            raise RuntimeError("No hay sesión de navegador activa")
+        
+        ids = []
+        for method, params in commands:
+            self._msg_id += 1
+            ids.append(self._msg_id)
+            self._ws.send(_dumps({"id": self._msg_id, "method": method, "params": params or {}}))
+        
+        # Los eventos CDP llegan por el mismo socket: se guardan para _wait_for_event
+        replies = {}
+        while len(replies) < len(ids):
+            reply = _loads(self._ws.recv(timeout))
+            if reply.get("id") in ids:
+                replies[reply["id"]] = reply
+            elif "method" in reply:
+                self._events.append(reply)
+        
+        results = []
+        for msg_id in ids:
+            reply = replies[msg_id]
+            if "error" in reply:
+                raise RuntimeError(reply["error"].get("message", reply["error"]))
+            results.append(reply.get("result", {}))
+        return results
+    
+    def _send_command(self, method: str, params: dict = None, timeout: float = 30) -> dict:
+        """Envía un comando CDP por el WebSocket y espera su respuesta."""
+        return self.send_batch([(method, params)], timeout)[0]
+    
+    def _wait_for_event(self, method: str, timeout: float) -> bool:
+        """Espera un evento CDP (o lo toma de los ya recibidos); False si no llega a tiempo."""
+        if any(event["method"] == method for event in self._events):
+            self._events.clear()
+            return True
+        
+        deadline = time.monotonic() + timeout
+        while (remaining := deadline - time.monotonic()) > 0:
+            try:
+                message = _loads(self._ws.recv(remaining))
+            except TimeoutError:
+                return False
+            if message.get("method") == method:
+                return True
+        return False
+    
+    def navigate_to_url(self, url: str, timeout: float = 30) -> str:
+        """Navega a una URL usando CDP y espera a que la página termine de cargar."""
         try:
             if not url.startswith(('http://', 'https://')):
                 url = 'http://' + url
             
-            # Obtener primera pestaña
-            tabs_response = requests.get(f"http://localhost:{self.port}/json")
-            tabs = tabs_response.json()
-            
-            if not tabs:
-                return "❌ No hay pestañas disponibles"
-            
-            tab_id = tabs[0]['id']
+            # Page.enable activa los eventos de carga; los anteriores a esta navegación no cuentan
+            self._events.clear()
+            _, result = self.send_batch([("Page.enable", {}), ("Page.navigate", {"url": url})])
+            if result.get("errorText"):
+                return f"❌ Error navegando: {result['errorText']}"
             
-            # Navegar
-            navigate_data = {
-                "id": 1,
-                "method": "Page.navigate",
-                "params": {"url": url}
-            }
+            # Sin loaderId es una navegación dentro del mismo documento (no hay evento load)
+            if result.get("loaderId") and not self._wait_for_event("Page.loadEventFired", timeout):
+                return f"⚠️ Navegación iniciada, pero la página no terminó de cargar en {timeout}s: {url}"
             
-            # Aquí necesitaríamos WebSocket para comando completo
-            # Por simplicidad, usamos la URL directa para ahora
-            return f"✅ Solicitada navegación a: {url}"
+            return f"✅ Navegación completada: {url}"
             
         except Exception as e:
             return f"❌ Error navegando: {e}"
@@ -124,8 +266,11 @@ class BrowserController:
             if not save_path:
                 save_path = f"screenshot_{int(time.time())}.png"
             
-            # Implementación simplificada - requiere WebSocket real para CDP completo
-            return f"✅ Funcionalidad de screenshot disponible (requiere implementación WebSocket completa)"
+            result = self._send_command("Page.captureScreenshot", {"format": "png"})
+            with open(save_path, "wb") as f:
+                f.write(base64.b64decode(result["data"]))
+            
+            return f"✅ Screenshot guardado en: {save_path}"
             
         except Exception as e:
             return f"❌ Error tomando screenshot: {e}"
@@ -133,6 +278,10 @@ class BrowserController:
     def close_browser(self) -> str:
         """Cierra el navegador."""
         try:
+            if self._ws is not None:
+                self._ws.close()
+                self._ws = None
+            
             if self.browser_process:
                 self.browser_process.terminate()
                 try:
@@ -141,6 +290,9 @@ class BrowserController:
                     self.browser_process.kill()
                 self.browser_process = None
             
+            # Liberar los sockets del pool; la sesión se puede reutilizar después
+            self._session.close()
+            
             return "✅ Navegador cerrado"
             
         except Exception as e:
@@ -1,8 +1,12 @@
+import atexit
 import os
-import xml.etree.ElementTree as ET
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 import re
 import html
+import tempfile
 
 import typer
 from rich.console import Console
@@ -11,6 +15,7 @@ from rich.markdown import Markdown
 
 from bytecrafter import agent, tools, ui
 from bytecrafter.memory import init_database, ConversationManager, ContextManager, LearningEngine
+from bytecrafter.memory.database import ENABLE_MEMORY
 
 app = typer.Typer()
 console = Console()
@@ -20,54 +25,118 @@ conversation_manager = ConversationManager()
 context_manager = ContextManager()
 learning_engine = LearningEngine()
 
-# Fallback: In-memory history for when memory is disabled
-conversation_history: List[Dict] = []
+# Las tres consultas de memoria son independientes (I/O de base de datos): se lanzan en paralelo
+_mem_pool = ThreadPoolExecutor(max_workers=3)
 
+# Respuestas de una palabra que no justifican una búsqueda en memoria
+_TRIVIAL_INPUTS = frozenset({"yes", "no", "ok", "okay", "sí", "si", "continue", "continua", "go", "stop", "thanks", "gracias"})
 
-def clean_tool_result_for_gemini(content: str) -> str:
-    """Limpia mensajes de tool_result para que Gemini no se confunda con el XML"""
-    if "<tool_result>" in content and "</tool_result>" in content:
-        try:
-            # Extraer tool_name y result del XML
-            tool_name_match = re.search(r'<tool_name>(.*?)</tool_name>', content)
-            result_match = re.search(r'<result>(.*?)</result>', content, re.DOTALL)
-            error_match = re.search(r'<error>(.*?)</error>', content, re.DOTALL)
-            
-            if tool_name_match:
-                tool_name = tool_name_match.group(1)
-                
-                if result_match:
-                    result = result_match.group(1)
-                    return f"Tool: {tool_name}\nResult: {result}"
-                elif error_match:
-                    error = error_match.group(1)
-                    return f"Tool: {tool_name}\nError: {error}"
-            
-            # Si no se puede parsear, devolver el contenido original
-            return content
-        except:
-            return content
+# Fallback: In-memory history for when memory is disabled
+conversation_history: List["HistoryMessage"] = []
+
+# Tamaño máximo mostrado en el panel de resultados: Rich mide y ajusta todo el
+# texto al renderizar, así que los resultados enormes se truncan
+_MAX_PANEL_CHARS = 32 * 1024
+
+# Directorio de la sesión con las salidas completas de los resultados truncados;
+# se crea al primer uso y se borra al salir
+_output_dir: Optional[str] = None
+
+def _session_output_dir() -> str:
+    """Devuelve (creándolo si hace falta) el directorio temporal de la sesión"""
+    global _output_dir
+    if _output_dir is None:
+        _output_dir = tempfile.mkdtemp(prefix="bytecrafter_")
+        atexit.register(shutil.rmtree, _output_dir, ignore_errors=True)
+    return _output_dir
+
+# Patrones precompilados para las respuestas del agente
+_RE_FENCE = re.compile(r'```xml|```')
+
+# Gramática fija de las respuestas del agente: <thinking>, una etiqueta de
+# herramienta y sus parámetros como hijos directos
+_RE_THINKING = re.compile(r'<thinking>(.*?)</thinking>', re.DOTALL)
+_RE_SKIPPED_BLOCKS = re.compile(r'<(thinking|tool_result)>.*?</\1>', re.DOTALL)
+_RE_TOOL_BLOCK = re.compile(r'<(\w+)\s*(?:/>|>(.*?)</\1>)', re.DOTALL)
+_RE_PARAM = re.compile(r'<(\w+)>(.*?)</\1>', re.DOTALL)
+# Etiqueta suelta (de apertura o cierre) que no forma parte de un bloque bien cerrado
+_RE_STRAY_TAG = re.compile(r'</?\w+\s*/?>')
+# Etiquetas de texto libre: su contenido se devuelve literal, sin decodificar entidades
+_FREE_TEXT_TAGS = frozenset({"command", "result", "question", "answer"})
+
+
+@dataclass
+class ToolResultMessage:
+    """Resultado de una herramienta; se renderiza una sola vez al añadirlo al historial"""
+    tool_name: str
+    result: str
+    is_error: bool = False
+
+    def render(self) -> str:
+        """Texto que recibe el LLM (y que se guarda en la base de datos)"""
+        label = "\nError: " if self.is_error else "\nResult: "
+        return "".join(("Tool: ", self.tool_name, label, str(self.result)))
+
+
+@dataclass(slots=True)
+class HistoryMessage:
+    """Mensaje del historial temporal; se convierte al formato del LLM solo al enviarlo"""
+    role: str
+    text: str
+
+
+def history_for_llm(history: List[HistoryMessage]) -> List[Dict]:
+    """Formato {"role", "parts"} que esperan los proveedores"""
+    return [{"role": msg.role, "parts": [{"text": msg.text}]} for msg in history]
+
+def append_history(role: str, text: str) -> None:
+    """Añade un mensaje al historial temporal"""
+    conversation_history.append(HistoryMessage(role, text))
+
+def pop_history() -> HistoryMessage:
+    """Quita el último mensaje del historial temporal"""
+    return conversation_history.pop()
+
+def clear_history() -> None:
+    """Vacía el historial temporal"""
+    conversation_history.clear()
+
+def record_tool_outcome(tool_name: str, tool_args: Dict, result: str, is_error: bool = False) -> None:
+    """Registra el resultado (o error) de una herramienta en memoria persistente y en el historial"""
+    tool_text = ToolResultMessage(tool_name, result, is_error).render()
+    if ENABLE_MEMORY:
+        conversation_manager.save_message("user", tool_text, tool_name, tool_args, result)
+    append_history("user", tool_text)
+
+def print_tool_result(tool_name: str, tool_result: str) -> None:
+    """Muestra el resultado de una herramienta; si es muy grande se trunca y se guarda completo en el directorio temporal de la sesión"""
+    text = str(tool_result)
+    if len(text) > _MAX_PANEL_CHARS:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix=f"{tool_name}_", suffix=".txt",
+                                         dir=_session_output_dir(), delete=False) as f:
+            f.write(text)
+        text = f"{text[:_MAX_PANEL_CHARS]}\n... [truncated {len(text) - _MAX_PANEL_CHARS} characters, full output in {f.name}]"
+    console.print(Panel(text, title=f"Result from [bold blue]{tool_name}[/bold blue]", border_style="green"))
+
+def collect_stream(response: Dict) -> Dict:
+    """Consume una respuesta en streaming mostrando el texto según llega
+
+    Devuelve la respuesta con `content` completo, o {"error": ...} si el stream se corta.
+    """
+    stream = response.get("stream") if isinstance(response, dict) else None
+    if stream is None:
+        return response
     
-    # Si no es tool_result, devolver tal como está
-    return content
-
-def clean_history_for_gemini(history: List[Dict]) -> List[Dict]:
-    """Limpia el historial completo para envío a Gemini"""
-    cleaned_history = []
-    for msg in history:
-        cleaned_msg = msg.copy()
-        # Limpiar cada parte del mensaje
-        if "parts" in cleaned_msg:
-            cleaned_parts = []
-            for part in cleaned_msg["parts"]:
-                if "text" in part:
-                    cleaned_text = clean_tool_result_for_gemini(part["text"])
-                    cleaned_parts.append({"text": cleaned_text})
-                else:
-                    cleaned_parts.append(part)
-            cleaned_msg["parts"] = cleaned_parts
-        cleaned_history.append(cleaned_msg)
-    return cleaned_history
+    chunks = []
+    try:
+        for chunk in stream:
+            console.print(chunk, end="", style="dim", markup=False, highlight=False)
+            chunks.append(chunk)
+    except Exception as e:
+        return {"error": f"LLM provider error: {e}"}
+    finally:
+        console.print()
+    return {"content": "".join(chunks)}
 
 def parse_agent_response(text: str) -> Optional[Tuple[str, str, Dict[str, str]]]:
     """
@@ -75,42 +144,34 @@ def parse_agent_response(text: str) -> Optional[Tuple[str, str, Dict[str, str]]]
     """
     try:
         # The response may contain markdown formatting, so we clean it first
-        cleaned_text = text.replace("```xml", "").replace("```", "").strip()
-        
-        # Sanitize special characters (e.g., & < >) inside tags that typically hold free-form text
-        for tag in ["command", "result", "question", "answer"]:
-            cleaned_text = re.sub(
-                rf"<{tag}>(.*?)</{tag}>",
-                lambda m: f"<{tag}>{html.escape(m.group(1))}</{tag}>",
-                cleaned_text,
-                flags=re.DOTALL,
-            )
-
-        # Wrap the text in a root tag to make it valid XML
-        xml_text = f"<root>{cleaned_text}</root>"
-        root = ET.fromstring(xml_text)
-
-        thinking_element = root.find("thinking")
-        thinking = thinking_element.text.strip() if thinking_element is not None and thinking_element.text else ""
-
-        tool_element = None
-        for child in root:
-            if child.tag not in ["thinking", "root", "tool_result"]:
-                tool_element = child
-                break
-        
-        if tool_element is None:
+        cleaned_text = _RE_FENCE.sub("", text).strip()
+
+        thinking_match = _RE_THINKING.search(cleaned_text)
+        thinking = html.unescape(thinking_match.group(1).strip()) if thinking_match else ""
+
+        # The tool is the first top-level tag that is neither thinking nor an echoed tool_result
+        remainder = _RE_SKIPPED_BLOCKS.sub("", cleaned_text)
+        tool_match = _RE_TOOL_BLOCK.search(remainder)
+        tool_body = (tool_match.group(2) or "") if tool_match else ""
+
+        # Any tag left outside a closed block (or between the parameters) means the XML is malformed
+        if (_RE_STRAY_TAG.search(_RE_TOOL_BLOCK.sub("", remainder))
+                or _RE_STRAY_TAG.search(_RE_PARAM.sub("", tool_body))):
+            console.print(f"[bold red]XML Parse Error: Failed to parse agent response.[/bold red]\nRaw Response:\n{text}")
+            return None
+
+        if tool_match is None:
             # This could be a pure thinking response without a tool
             return thinking, None, {}
 
-        tool_name = tool_element.tag
-        parameters = {child.tag: child.text.strip() if child.text else "" for child in tool_element}
+        tool_name = tool_match.group(1)
+        parameters = {}
+        for param in _RE_PARAM.finditer(tool_body):
+            name, value = param.group(1), param.group(2).strip()
+            parameters[name] = value if name in _FREE_TEXT_TAGS else html.unescape(value)
 
         return thinking, tool_name, parameters
 
-    except ET.ParseError as e:
-        console.print(f"[bold red]XML Parse Error: Failed to parse agent response.[/bold red]\nRaw Response:\n{text}")
-        return None
     except Exception as e:
         console.print(f"[bold red]An unexpected error occurred during parsing: {e}[/bold red]")
         return None
@@ -121,99 +182,95 @@ def run_tool_loop(model: str):
     The main autonomous loop for the agent.
     It continuously executes tools until the task is completed, requires user input, or an error occurs.
     """
-    while True:
-        console.print("\n[bold]Thinking...[/bold]")
+    try:
+        while True:
+            console.print("\n[bold]Thinking...[/bold]")
         
-        # Usar memoria persistente o temporal según disponibilidad
-        if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
-            # Obtener historial desde base de datos (ya limpiado)
-            history = conversation_manager.get_conversation_history()
-            if not history:
-                history = clean_history_for_gemini(conversation_history)  # Limpiar fallback
-        else:
-            history = clean_history_for_gemini(conversation_history)
+            # Usar memoria persistente o temporal según disponibilidad
+            if ENABLE_MEMORY:
+                # Obtener historial desde base de datos (ya limpiado)
+                history = conversation_manager.get_conversation_history()
+                if not history:
+                    history = history_for_llm(conversation_history)  # Fallback en memoria
+            else:
+                history = history_for_llm(conversation_history)
         
-        response = agent.get_llm_response(history, model or None)
+            response = collect_stream(agent.get_llm_response(history, model or None))
         
-        if "error" in response:
-            console.print(Panel(f"[bold red]Error:[/bold red] {response['error']}", title="Error", border_style="red"))
-            break # Exit the loop on API error
-
-        # Convert response to plain text depending on provider
-        if isinstance(response, dict) and "content" in response:
-            agent_response_text = response["content"]
-        else:
-            console.print("[bold red]Unrecognized response format from LLM provider[/bold red]")
-            break
+            if "error" in response:
+                console.print(Panel(f"[bold red]Error:[/bold red] {response['error']}", title="Error", border_style="red"))
+                break # Exit the loop on API error
+
+            # Convert response to plain text depending on provider
+            if isinstance(response, dict) and "content" in response:
+                agent_response_text = response["content"]
+            else:
+                console.print("[bold red]Unrecognized response format from LLM provider[/bold red]")
+                break
         
-        # Guardar respuesta del agente en memoria persistente
-        conversation_manager.save_message("model", agent_response_text)
-        conversation_history.append({"role": "model", "parts": [{"text": agent_response_text}]})
-
-        parsed_response = parse_agent_response(agent_response_text)
-        if not parsed_response:
-            break # Exit loop on parsing error
-
-        thinking, tool_name, tool_args = parsed_response
-
-        if not tool_name:
-             ui.display_thinking(thinking)
-             console.print("[bold yellow]Agent paused. What's the next step?[/bold yellow]")
-             break
-
-        if tool_name == "ask_followup_question":
-            ui.display_question(thinking, tool_args.get("question", "No question found."))
-            break # Exit loop to get user input
-
-        if tool_name == "attempt_completion":
-            ui.display_completion(thinking, tool_args.get("result", "No result found."))
-            # Completar conversación en memoria persistente
-            completion_summary = tool_args.get("result", "Tarea completada")[:200]
-            conversation_manager.complete_conversation(completion_summary)
-            return "COMPLETED" # Signal completion to the main function
-
-        # For all other tools, execute them without asking for confirmation
-        console.print(f"\n[bold cyan]🤖 Bytecrafter is running [bold blue]{tool_name}[/bold blue]...[/bold cyan]")
-        ui.display_thinking(thinking)
+            # Guardar respuesta del agente en memoria persistente
+            conversation_manager.save_message("model", agent_response_text)
+            append_history("model", agent_response_text)
+
+            parsed_response = parse_agent_response(agent_response_text)
+            if not parsed_response:
+                break # Exit loop on parsing error
+
+            thinking, tool_name, tool_args = parsed_response
+
+            if not tool_name:
+                 ui.display_thinking(thinking)
+                 console.print("[bold yellow]Agent paused. What's the next step?[/bold yellow]")
+                 break
+
+            if tool_name == "ask_followup_question":
+                ui.display_question(thinking, tool_args.get("question", "No question found."))
+                break # Exit loop to get user input
+
+            if tool_name == "attempt_completion":
+                ui.display_completion(thinking, tool_args.get("result", "No result found."))
+                # Completar conversación en memoria persistente
+                completion_summary = tool_args.get("result", "Tarea completada")[:200]
+                conversation_manager.complete_conversation(completion_summary)
+                return "COMPLETED" # Signal completion to the main function
+
+            # For all other tools, execute them without asking for confirmation
+            console.print(f"\n[bold cyan]🤖 Bytecrafter is running [bold blue]{tool_name}[/bold blue]...[/bold cyan]")
+            ui.display_thinking(thinking)
         
-        try:
-            tool_function = getattr(tools, tool_name)
-            tool_result = tool_function(**tool_args)
+            try:
+                tool_function = getattr(tools, tool_name)
+                tool_result = tool_function(**tool_args)
 
-            console.print(Panel(tool_result, title=f"Result from [bold blue]{tool_name}[/bold blue]", border_style="green"))
+                print_tool_result(tool_name, tool_result)
 
-            tool_result_text = f"<tool_result><tool_name>{tool_name}</tool_name><result>{tool_result}</result></tool_result>"
-            
-            # Guardar resultado de herramienta en memoria persistente
-            conversation_manager.save_message("user", tool_result_text, tool_name, tool_args, tool_result)
-            conversation_history.append({"role": "user", "parts": [{"text": tool_result_text}]})
+                record_tool_outcome(tool_name, tool_args, tool_result)
             
-            # Aprender de la herramienta ejecutada (solo patrones exitosos)
-            if tool_name in ["read_file", "list_files"]:
-                learning_engine.learn_user_pattern("tool_usage", {
-                    "key": tool_name,
-                    "success": True,
-                    "context": tool_args
-                })
+                # Aprender de la herramienta ejecutada (solo patrones exitosos)
+                if tool_name in ["read_file", "list_files"]:
+                    learning_engine.learn_user_pattern("tool_usage", {
+                        "key": tool_name,
+                        "success": True,
+                        "context": tool_args
+                    })
         
-        except Exception as e:
-            error_message = f"Error executing tool {tool_name}: {e}"
-            console.print(f"[bold red]{error_message}[/bold red]")
-            tool_error_text = f"<tool_result><tool_name>{tool_name}</tool_name><error>{error_message}</error></tool_result>"
-            
-            # Guardar error en memoria persistente
-            conversation_manager.save_message("user", tool_error_text, tool_name, tool_args, error_message)
-            conversation_history.append({"role": "user", "parts": [{"text": tool_error_text}]})
+            except Exception as e:
+                error_message = f"Error executing tool {tool_name}: {e}"
+                console.print(f"[bold red]{error_message}[/bold red]")
+                record_tool_outcome(tool_name, tool_args, error_message, is_error=True)
             
-            # Aprender del error
-            learning_engine.learn_error_solution(
-                error_type=type(e).__name__,
-                error_message=str(e),
-                solution="Tool execution failed - review parameters",
-                context={"tool_name": tool_name, "tool_args": tool_args}
-            )
+                # Aprender del error
+                learning_engine.learn_error_solution(
+                    error_type=type(e).__name__,
+                    error_message=str(e),
+                    solution="Tool execution failed - review parameters",
+                    context={"tool_name": tool_name, "tool_args": tool_args}
+                )
             
-            break # Exit loop on tool error
+                break # Exit loop on tool error
+    finally:
+        # Nada queda sin guardar al salir del bucle autónomo
+        conversation_manager.flush()
 
 @app.command()
 def main(
@@ -238,6 +295,9 @@ def main(
         console.print("⚠️  [yellow]Sistema de memoria desactivado - usando memoria temporal[/yellow]")
     
     console.print("Your AI assistant for coding tasks. Type 'exit' or 'quit' to end.")
+    
+    # Último bloque de memoria añadido al historial (no se repite si no cambia)
+    last_memory_context = None
 
     while True:
         try:
@@ -249,53 +309,57 @@ def main(
                 break
             
             # Agregar contexto de memoria a la consulta del usuario
-            if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
-                # Buscar contexto relevante en conversaciones anteriores
-                conversation_context = conversation_manager.get_context_for_query(user_input)
-                
-                # Buscar contexto relevante en proyectos
-                project_context = context_manager.get_context_for_query(user_input)
-                
-                # Buscar contexto relevante en aprendizajes
-                learning_context = learning_engine.get_context_for_query(user_input)
-                
-                # Construir mensaje enriquecido con contexto
-                enriched_input = user_input
+            user_message = user_input
+            previous_memory_context = last_memory_context
+            if ENABLE_MEMORY:
+                # Buscar contexto relevante en conversaciones anteriores, proyectos y aprendizajes
+                # (las entradas muy cortas o triviales no aportan nada a la búsqueda)
                 context_parts = []
+                if len(user_input) >= 8 and user_input.strip().lower() not in _TRIVIAL_INPUTS:
+                    futures = [
+                        _mem_pool.submit(lookup, user_input)
+                        for lookup in (
+                            conversation_manager.get_context_for_query,
+                            context_manager.get_context_for_query,
+                            learning_engine.get_context_for_query,
+                        )
+                    ]
+                    context_parts = [context for context in (f.result() for f in futures) if context]
                 
-                if conversation_context:
-                    context_parts.append(conversation_context)
-                if project_context:
-                    context_parts.append(project_context)
-                if learning_context:
-                    context_parts.append(learning_context)
-                
+                # El contexto (orden fijo de las fuentes) precede al texto del usuario en el
+                # mismo turno, para no romper la alternancia de roles, y solo cuando cambia:
+                # el prefijo del historial se mantiene idéntico entre turnos (caché de prompts)
                 if context_parts:
-                    enriched_input = f"{user_input}\n\n{chr(10).join(context_parts)}"
-                    console.print("[dim]🧠 Consultando memoria previa...[/dim]")
+                    memory_text = "\n\n".join(["[memory]", *context_parts])
+                    if memory_text != last_memory_context:
+                        console.print("[dim]🧠 Consultando memoria previa...[/dim]")
+                        user_message = f"{memory_text}\n\n{user_input}"
+                        last_memory_context = memory_text
                 
                 # Guardar mensaje del usuario en memoria persistente
-                conversation_manager.save_message("user", enriched_input)
-                conversation_history.append({"role": "user", "parts": [{"text": enriched_input}]})
-            else:
-                conversation_history.append({"role": "user", "parts": [{"text": user_input}]})
+                conversation_manager.save_message("user", user_message)
+            append_history("user", user_message)
 
             # 2. Get the first plan from the agent
             console.print("\n[bold]Thinking...[/bold]")
             
             # Usar memoria persistente o temporal según disponibilidad
-            if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
+            if ENABLE_MEMORY:
                 history = conversation_manager.get_conversation_history()
                 if not history:
-                    history = clean_history_for_gemini(conversation_history)
+                    history = history_for_llm(conversation_history)
             else:
-                history = clean_history_for_gemini(conversation_history)
+                history = history_for_llm(conversation_history)
                 
-            response = agent.get_llm_response(history, model or None)
+            response = collect_stream(agent.get_llm_response(history, model or None))
 
             if "error" in response:
                 console.print(Panel(f"[bold red]Error:[/bold red] {response['error']}", title="Error", border_style="red"))
-                conversation_history.pop()
+                # El turno no llegó al LLM: se deshace entero, contexto de memoria incluido
+                pop_history()
+                if ENABLE_MEMORY:
+                    conversation_manager.discard_last_message()
+                last_memory_context = previous_memory_context
                 continue
             
             # Convert response to plain text depending on provider
@@ -306,10 +370,10 @@ def main(
                 break
             
             # Guardar respuesta del agente en memoria persistente
-            if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
+            if ENABLE_MEMORY:
                 conversation_manager.save_message("model", agent_response_text)
                 
-            conversation_history.append({"role": "model", "parts": [{"text": agent_response_text}]})
+            append_history("model", agent_response_text)
 
             parsed_response = parse_agent_response(agent_response_text)
             if not parsed_response:
@@ -327,15 +391,9 @@ def main(
                 try:
                     tool_function = getattr(tools, tool_name)
                     tool_result = tool_function(**tool_args)
-                    console.print(Panel(tool_result, title=f"Result from [bold blue]{tool_name}[/bold blue]", border_style="green"))
+                    print_tool_result(tool_name, tool_result)
                     
-                    tool_result_text = f"<tool_result><tool_name>{tool_name}</tool_name><result>{tool_result}</result></tool_result>"
-                    
-                    # Guardar resultado de herramienta en memoria persistente
-                    if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
-                        conversation_manager.save_message("user", tool_result_text, tool_name, tool_args, tool_result)
-                        
-                    conversation_history.append({"role": "user", "parts": [{"text": tool_result_text}]})
+                    record_tool_outcome(tool_name, tool_args, tool_result)
 
                     # 5. Start the autonomous loop
                     loop_status = run_tool_loop(model)
@@ -343,17 +401,17 @@ def main(
                         console.print("[bold green]Agent finished the task. Ready for a new one.[/bold green]")
                         
                         # En lugar de borrar completamente, iniciar nueva conversación
-                        if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
+                        if ENABLE_MEMORY:
                             # La conversación ya se marcó como completada en run_tool_loop
                             console.print("[dim]💾 Conversación guardada en memoria persistente[/dim]")
                         else:
-                            conversation_history.clear() # Solo limpiar si no hay memoria persistente
+                            clear_history() # Solo limpiar si no hay memoria persistente
 
                 except Exception as e:
                     console.print(f"[bold red]Error executing initial tool {tool_name}: {e}[/bold red]")
                     
                     # Aprender del error
-                    if os.getenv("ENABLE_MEMORY", "true").lower() == "true":
+                    if ENABLE_MEMORY:
                         learning_engine.learn_error_solution(
                             error_type=type(e).__name__,
                             error_message=str(e),
@@ -364,8 +422,8 @@ def main(
                 console.print("[bold red]Execution cancelled by user.[/bold red]")
                 
                 # No borrar historial cuando se cancela - mantener contexto
-                if os.getenv("ENABLE_MEMORY", "true").lower() != "true":
-                    conversation_history.clear()
+                if not ENABLE_MEMORY:
+                    clear_history()
                 
         except KeyboardInterrupt:
             console.print("\n[bold]Goodbye![/bold]")
@@ -373,7 +431,10 @@ def main(
         except Exception as e:
             console.print(f"[bold red]An unexpected error occurred in main loop: {e}[/bold red]")
             if conversation_history:
-                conversation_history.pop()
+                pop_history()
+
+    # Guardar lo que quede pendiente antes de salir
+    conversation_manager.flush()
 
 
 if __name__ == "__main__":
@@ -3,34 +3,60 @@ import os
 from pathlib import Path
 from typing import Dict
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 
 REGISTRY_FILE = Path(os.getenv("MCP_REGISTRY_FILE", os.path.expanduser("~/.bytecrafter_mcp_servers.json")))
 
 
+# Cached registry contents and the file mtime they were read at
+_cache: Dict[str, dict] | None = None
+_cache_mtime: float = -1.0
+
+
 def _load() -> Dict[str, dict]:
-    if REGISTRY_FILE.exists():
-        try:
-            with REGISTRY_FILE.open("r", encoding="utf-8") as f:
-                return json.load(f) or {}
-        except Exception:
-            return {}
-    return {}
+    """Return the registry, re-reading the file only when its mtime changed."""
+    global _cache, _cache_mtime
+    # A single stat tells us both whether the file exists and whether it changed
+    try:
+        mtime = os.stat(REGISTRY_FILE).st_mtime
+    except FileNotFoundError:
+        return {}
+    if _cache is not None and mtime == _cache_mtime:
+        return _cache
+    try:
+        with open(REGISTRY_FILE, "rb") as f:
+            raw = f.read()
+        data = (orjson.loads(raw) if orjson else json.loads(raw)) or {}
+    except Exception:
+        return {}
+    _cache, _cache_mtime = data, mtime
+    return data
 
 
 def _save(data: Dict[str, dict]):
+    global _cache, _cache_mtime
     REGISTRY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with REGISTRY_FILE.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
+    if orjson:
+        REGISTRY_FILE.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with REGISTRY_FILE.open("w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    # What we just wrote is the registry: no need to read it back on the next lookup
+    _cache, _cache_mtime = data, REGISTRY_FILE.stat().st_mtime
 
 
 def add_server(name: str, command: str) -> None:
-    data = _load()
+    data = dict(_load())
     data[name] = {"command": command}
     _save(data)
 
 
 def remove_server(name: str) -> bool:
-    data = _load()
+    data = dict(_load())
     if name in data:
         data.pop(name)
         _save(data)
@@ -1,47 +1,64 @@
+import asyncio
 import json
-import subprocess
 import threading
-import time
 import uuid
 import sys
 import shlex
 from typing import Any, Dict, Optional
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# Largest single JSON-RPC line accepted from a server (asyncio's default is 64 KiB)
+_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def _build_command(command: str | list[str]) -> list[str]:
+    # Accept either a shell string or a list. If it's a python file, run with current interpreter.
+    if isinstance(command, str):
+        if command.endswith(".py"):
+            return [sys.executable, command]
+        return shlex.split(command)
+    return command
 
-class StdioClient:
-    """Simple JSON-RPC 2.0 client over STDIO for MCP servers.
 
-    The client spawns the server process locally and communicates using
-    newline-delimited JSON messages on stdin/stdout.
+class AsyncStdioClient:
+    """Asyncio JSON-RPC 2.0 client over STDIO for MCP servers.
+
+    The server process is spawned with asyncio.create_subprocess_exec and
+    speaks newline-delimited JSON on stdin/stdout. Responses are matched to
+    requests by id through one Future per in-flight request, so any number of
+    clients can share a single event loop without threads or polling.
+    Create instances with ``await AsyncStdioClient.start(command)``.
     """
 
     def __init__(self, command: str | list[str]):
-        # Accept either a shell string or a list. If it's a python file, run with current interpreter.
-        if isinstance(command, str):
-            if command.endswith(".py"):
-                cmd_list = [sys.executable, command]
-            else:
-                cmd_list = shlex.split(command)
-        else:
-            cmd_list = command
-
-        self._proc = subprocess.Popen(
-            cmd_list,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,
+        self._cmd = _build_command(command)
+        self._proc: asyncio.subprocess.Process | None = None
+        self._pending: dict[str, asyncio.Future] = {}
+        self._reader_task: asyncio.Task | None = None
+
+    @classmethod
+    async def start(cls, command: str | list[str]) -> "AsyncStdioClient":
+        """Spawn the server process and start reading its responses."""
+        client = cls(command)
+        client._proc = await asyncio.create_subprocess_exec(
+            *client._cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=_LINE_LIMIT,
         )
-        self._lock = threading.Lock()
-        self._responses: dict[str, Any] = {}
-        self._reader_thread = threading.Thread(target=self._reader_loop, daemon=True)
-        self._reader_thread.start()
+        client._reader_task = asyncio.create_task(client._reader())
+        return client
 
     # -------------------------------------------------------------
     # Public API
     # -------------------------------------------------------------
-    def send_request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 15.0) -> Any:
+    async def send_request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 15.0) -> Any:
         """Sends a JSON-RPC request and waits for the response."""
         req_id = str(uuid.uuid4())
         message = {
@@ -50,45 +67,101 @@ class StdioClient:
             "method": method,
             "params": params or {},
         }
-        line = json.dumps(message, ensure_ascii=False)
-        with self._lock:
-            if self._proc.stdin is None:
-                raise RuntimeError("Process stdin closed")
-            self._proc.stdin.write(line + "\n")
-            self._proc.stdin.flush()
-
-        # Wait for response
-        start = time.time()
-        while time.time() - start < timeout:
-            if req_id in self._responses:
-                return self._responses.pop(req_id)
-            time.sleep(0.05)
-        return {"error": "timeout"}
+        line = orjson.dumps(message) if orjson else json.dumps(message, ensure_ascii=False).encode("utf-8")
+        if self._proc is None or self._proc.stdin is None:
+            raise RuntimeError("Process stdin closed")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[req_id] = future
+        try:
+            # write() only buffers, so concurrent requests never interleave within a line
+            self._proc.stdin.write(line + b"\n")
+            await self._proc.stdin.drain()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            return {"error": "timeout"}
+        finally:
+            self._pending.pop(req_id, None)
 
-    def close(self):
+    async def close(self):
         """Terminate the server process gracefully."""
+        if self._proc is None:
+            return
         try:
             if self._proc.stdin:
                 self._proc.stdin.close()
-            if self._proc.poll() is None:
+            if self._proc.returncode is None:
                 self._proc.terminate()
+            await asyncio.wait_for(self._proc.wait(), 5)
         except Exception:
             pass
+        if self._reader_task:
+            self._reader_task.cancel()
 
     # -------------------------------------------------------------
     # Internal helpers
     # -------------------------------------------------------------
-    def _reader_loop(self):
-        if self._proc.stdout is None:
-            return
-        for raw_line in self._proc.stdout:
-            line = raw_line.strip()
-            if not line:
-                continue
-            try:
-                data = json.loads(line)
-            except json.JSONDecodeError:
-                continue
-            resp_id = data.get("id")
-            if resp_id:
-                self._responses[resp_id] = data.get("result", data) 
\ No newline at end of file
+    async def _reader(self):
+        try:
+            async for raw_line in self._proc.stdout:
+                line = raw_line.strip()
+                if not line:
+                    continue
+                try:
+                    data = orjson.loads(line) if orjson else json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(data, dict) or "id" not in data:
+                    continue
+                # Late replies (request already timed out) and unknown ids are dropped
+                future = self._pending.get(data["id"])
+                if future is not None and not future.done():
+                    future.set_result(data.get("result", data))
+        except ValueError:
+            pass  # line longer than _LINE_LIMIT: the stream can't be resynchronised
+        # Server closed stdout: wake every waiter instead of letting it hit the timeout
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result({"error": "server closed the connection"})
+
+
+# One event loop, on one daemon thread, serves every synchronous client
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="mcp-stdio", daemon=True).start()
+        return _loop
+
+
+class StdioClient:
+    """Blocking wrapper around AsyncStdioClient for non-async call sites.
+
+    Requests run on a shared background event loop; each call blocks until
+    its response (or timeout) arrives.
+    """
+
+    def __init__(self, command: str | list[str]):
+        self._loop = _get_loop()
+        self._client = self._run(AsyncStdioClient.start(command))
+
+    def _run(self, coro, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    # -------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------
+    def send_request(self, method: str, params: Optional[Dict[str, Any]] = None, timeout: float = 15.0) -> Any:
+        """Sends a JSON-RPC request and waits for the response."""
+        return self._run(self._client.send_request(method, params, timeout))
+
+    def close(self):
+        """Terminate the server process gracefully."""
+        try:
+            self._run(self._client.close(), timeout=10)
+        except Exception:
+            pass
@@ -7,7 +7,7 @@ Este módulo proporciona capacidades de memoria persistente para recordar:
 - Aprendizajes y patrones de uso
 """
 
-from .database import init_database, get_session
+from .database import init_database, get_session, session_scope
 from .conversation_manager import ConversationManager
 from .context_manager import ContextManager
 from .learning_engine import LearningEngine
@@ -15,6 +15,7 @@ from .learning_engine import LearningEngine
 __all__ = [
     'init_database',
     'get_session', 
+    'session_scope',
     'ConversationManager',
     'ContextManager',
     'LearningEngine'
@@ -4,17 +4,57 @@ Gestor de contexto de proyectos para memoria persistente
 
 import os
 import json
+import time
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
-from sqlalchemy import String
-from .database import get_session, ProjectContext
+from sqlalchemy import String, func, literal, literal_column, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import database
+from .database import session_scope, ProjectContext
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# INSERT con soporte de ON CONFLICT DO UPDATE según el dialecto
+_UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+
+def _dumps(data: Any) -> str:
+    """Serializa a JSON (orjson si está disponible)"""
+    if orjson:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+def _iter_texts(data: Any):
+    """Genera, en orden, las claves y los valores escalares (como texto) de un JSON"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            yield str(key)
+            yield from _iter_texts(value)
+    elif isinstance(data, (list, tuple)):
+        for item in data:
+            yield from _iter_texts(item)
+    elif data is not None:
+        yield data if isinstance(data, str) else str(data)
 
 class ContextManager:
     """Gestiona el contexto y información de proyectos"""
     
+    # Caché de get_project_info: segundos de validez y número máximo de entradas
+    CACHE_TTL = 30
+    CACHE_MAX_ENTRIES = 512
+    
     def __init__(self):
         self.current_project = self._detect_current_project()
+        # (project_name, info_type) -> (instante de carga, resultados)
+        self._ctx_cache: Dict[Tuple[str, Optional[str]], Tuple[float, List[Dict[str, Any]]]] = {}
+        # (project_name, file_path) -> (mtime del archivo al cargar, análisis)
+        self._analysis_cache: Dict[Tuple[str, str], Tuple[float, Optional[Dict[str, Any]]]] = {}
     
     def _detect_current_project(self) -> str:
         """Detecta el proyecto actual basado en el directorio"""
@@ -22,80 +62,110 @@ class ContextManager:
             cwd = os.getcwd()
             project_name = os.path.basename(cwd)
             return project_name
-        except:
+        except OSError:
             return "unknown_project"
     
     def save_project_info(self, project_name: str, info_type: str, 
                          data: Dict[str, Any], file_path: str = None) -> bool:
         """Guarda información sobre un proyecto"""
-        session = get_session()
-        if session is None:
-            return False
-        
         try:
-            # Buscar si ya existe
-            existing = session.query(ProjectContext).filter(
-                ProjectContext.project_name == project_name,
-                ProjectContext.file_path == file_path,
-                ProjectContext.context_type == info_type
-            ).first()
-            
-            if existing:
-                existing.context_data = data
-                existing.last_accessed = datetime.now(timezone.utc)
-            else:
-                context = ProjectContext(
-                    project_name=project_name,
-                    file_path=file_path,
-                    context_type=info_type,
-                    context_data=data
-                )
-                session.add(context)
+            with session_scope() as session:
+                if session is None:
+                    return False
+                
+                dialect_insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+                if file_path is not None and dialect_insert is not None:
+                    # Un solo INSERT ... ON CONFLICT DO UPDATE sobre la restricción única.
+                    # Con file_path NULL nunca hay conflicto (NULL es distinto de NULL),
+                    # por eso esas filas siguen buscando antes de escribir
+                    stmt = dialect_insert(ProjectContext).values(
+                        project_name=project_name,
+                        file_path=file_path,
+                        context_type=info_type,
+                        context_data=data
+                    )
+                    session.execute(stmt.on_conflict_do_update(
+                        index_elements=["project_name", "file_path", "context_type"],
+                        set_={"context_data": stmt.excluded.context_data, "last_accessed": func.now()}
+                    ))
+                else:
+                    # Buscar si ya existe
+                    existing = session.query(ProjectContext).filter(
+                        ProjectContext.project_name == project_name,
+                        ProjectContext.file_path == file_path,
+                        ProjectContext.context_type == info_type
+                    ).first()
+                    
+                    if existing:
+                        existing.context_data = data
+                        existing.last_accessed = datetime.now(timezone.utc)
+                    else:
+                        context = ProjectContext(
+                            project_name=project_name,
+                            file_path=file_path,
+                            context_type=info_type,
+                            context_data=data
+                        )
+                        session.add(context)
             
-            session.commit()
-            session.close()
+            # La consulta filtrada por tipo y la consulta de todo el proyecto quedan obsoletas
+            self._ctx_cache.pop((project_name, info_type), None)
+            self._ctx_cache.pop((project_name, None), None)
+            if info_type == "file_analysis":
+                self._analysis_cache.pop((project_name, file_path), None)
             return True
             
         except Exception as e:
             print(f"❌ Error guardando contexto de proyecto: {e}")
-            if session:
-                session.rollback()
-                session.close()
             return False
     
     def get_project_info(self, project_name: str, info_type: str = None) -> List[Dict[str, Any]]:
-        """Obtiene información de un proyecto"""
-        session = get_session()
-        if session is None:
-            return []
+        """Obtiene información de un proyecto (cacheada durante CACHE_TTL segundos)"""
+        key = (project_name, info_type)
+        cached = self._ctx_cache.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.CACHE_TTL:
+            return cached[1]
         
         try:
-            query = session.query(ProjectContext).filter(
-                ProjectContext.project_name == project_name
-            )
-            
-            if info_type:
-                query = query.filter(ProjectContext.context_type == info_type)
-            
-            contexts = query.order_by(ProjectContext.last_accessed.desc()).all()
-            
-            results = []
-            for ctx in contexts:
-                results.append({
-                    "type": ctx.context_type,
-                    "file_path": ctx.file_path,
-                    "data": ctx.context_data,
-                    "last_accessed": ctx.last_accessed.isoformat(),
-                    "created_at": ctx.created_at.isoformat()
-                })
+            with session_scope() as session:
+                if session is None:
+                    return []
+                
+                # Solo las columnas que se devuelven, como filas (sin objetos ProjectContext)
+                query = select(
+                    ProjectContext.context_type,
+                    ProjectContext.file_path,
+                    ProjectContext.context_data,
+                    ProjectContext.last_accessed,
+                    ProjectContext.created_at
+                ).where(ProjectContext.project_name == project_name)
+                
+                if info_type:
+                    query = query.where(ProjectContext.context_type == info_type)
+                
+                rows = session.execute(
+                    query.order_by(ProjectContext.last_accessed.desc()).execution_options(yield_per=256)
+                )
+                
+                results = [
+                    {
+                        "type": context_type,
+                        "file_path": file_path,
+                        "data": context_data,
+                        "last_accessed": last_accessed.isoformat(),
+                        "created_at": created_at.isoformat()
+                    }
+                    for context_type, file_path, context_data, last_accessed, created_at in rows
+                ]
             
-            session.close()
+            if len(self._ctx_cache) >= self.CACHE_MAX_ENTRIES:
+                # Descartar la entrada más antigua (los dict conservan el orden de inserción)
+                self._ctx_cache.pop(next(iter(self._ctx_cache)))
+            self._ctx_cache[key] = (time.monotonic(), results)
             return results
             
         except Exception as e:
             print(f"❌ Error obteniendo contexto de proyecto: {e}")
-            if session:
-                session.close()
             return []
     
     def save_file_structure(self, project_name: str, structure: Dict[str, Any]) -> bool:
@@ -122,25 +192,40 @@ class ContextManager:
         )
     
     def get_file_analysis(self, project_name: str, file_path: str) -> Optional[Dict[str, Any]]:
-        """Obtiene análisis de un archivo específico"""
-        session = get_session()
-        if session is None:
-            return None
+        """Obtiene análisis de un archivo específico
+
+        El resultado se cachea mientras el archivo no cambie (misma fecha de modificación).
+        """
+        try:
+            mtime = os.stat(file_path).st_mtime
+        except OSError:
+            mtime = 0
+        
+        key = (project_name, file_path)
+        cached = self._analysis_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
         
         try:
-            context = session.query(ProjectContext).filter(
-                ProjectContext.project_name == project_name,
-                ProjectContext.file_path == file_path,
-                ProjectContext.context_type == "file_analysis"
-            ).first()
+            with session_scope() as session:
+                if session is None:
+                    return None
+                
+                context = session.query(ProjectContext).filter(
+                    ProjectContext.project_name == project_name,
+                    ProjectContext.file_path == file_path,
+                    ProjectContext.context_type == "file_analysis"
+                ).first()
+                
+                analysis = context.context_data if context else None
             
-            session.close()
-            return context.context_data if context else None
+            if len(self._analysis_cache) >= self.CACHE_MAX_ENTRIES:
+                self._analysis_cache.pop(next(iter(self._analysis_cache)))
+            self._analysis_cache[key] = (mtime, analysis)
+            return analysis
             
         except Exception as e:
             print(f"❌ Error obteniendo análisis de archivo: {e}")
-            if session:
-                session.close()
             return None
     
     def save_user_preferences(self, project_name: str, preferences: Dict[str, Any]) -> bool:
@@ -156,77 +241,124 @@ class ContextManager:
         contexts = self.get_project_info(project_name, "user_preferences")
         return contexts[0]["data"] if contexts else None
     
+    def _search_filter(self, query: str) -> Tuple[Any, Dict[str, str]]:
+        """Condición de búsqueda sobre context_data y sus parámetros
+
+        Compatible con SQLite y PostgreSQL:
+        SQLite usa el índice FTS5 trigram (necesita al menos 3 caracteres);
+        PostgreSQL, texto completo sobre los valores del JSON, servido por el
+        índice GIN ix_pc_data_fts, sin convertir cada fila a texto.
+        """
+        if database.PROJECT_CONTEXT_SEARCH == "fts5" and len(query) >= 3:
+            matching_ids = select(literal_column("rowid")).select_from(
+                text("project_context_fts")
+            ).where(text("project_context_fts MATCH :fts_query"))
+            return ProjectContext.id.in_(matching_ids), {"fts_query": '"' + query.replace('"', '""') + '"'}
+        
+        if database.PROJECT_CONTEXT_SEARCH == "tsvector":
+            return text(
+                "jsonb_to_tsvector('simple', project_context.context_data::jsonb, '[\"all\"]') "
+                "@@ plainto_tsquery('simple', :fts_query)"
+            ), {"fts_query": query}
+        
+        return ProjectContext.context_data.cast(String).ilike(f"%{query}%"), {}
+    
     def search_project_context(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Busca en el contexto de proyectos"""
-        session = get_session()
-        if session is None:
-            return []
-        
         try:
-            # Buscar en los datos JSON (compatible con SQLite y PostgreSQL)
-            contexts = session.query(ProjectContext).filter(
-                ProjectContext.context_data.cast(String).ilike(f"%{query}%")
-            ).order_by(ProjectContext.last_accessed.desc()).limit(limit).all()
-            
-            results = []
-            for ctx in contexts:
-                results.append({
-                    "project_name": ctx.project_name,
-                    "type": ctx.context_type,
-                    "file_path": ctx.file_path,
-                    "data": ctx.context_data,
-                    "relevance_snippet": self._extract_relevant_snippet(ctx.context_data, query),
-                    "last_accessed": ctx.last_accessed.isoformat()
-                })
-            
-            session.close()
-            return results
-            
+            with session_scope() as session:
+                if session is None:
+                    return []
+                
+                search_filter, params = self._search_filter(query)
+                search = session.query(ProjectContext).filter(search_filter).params(**params)
+                contexts = search.order_by(ProjectContext.last_accessed.desc()).limit(limit).all()
+                
+                results = []
+                for ctx in contexts:
+                    results.append({
+                        "project_name": ctx.project_name,
+                        "type": ctx.context_type,
+                        "file_path": ctx.file_path,
+                        "data": ctx.context_data,
+                        "relevance_snippet": self._extract_relevant_snippet(ctx.context_data, query),
+                        "last_accessed": ctx.last_accessed.isoformat()
+                    })
+                
+                return results
+                
         except Exception as e:
             print(f"❌ Error buscando contexto de proyecto: {e}")
-            if session:
-                session.close()
             return []
     
     def _extract_relevant_snippet(self, data: Dict[str, Any], query: str) -> str:
-        """Extrae snippet relevante de los datos"""
+        """Extrae snippet relevante de los datos
+
+        Recorre claves y valores en orden y se detiene en el primer texto que contiene
+        la query, sin serializar todo el documento.
+        """
         try:
-            data_str = json.dumps(data, ensure_ascii=False)
             query_lower = query.lower()
             
-            # Buscar la posición de la query
-            pos = data_str.lower().find(query_lower)
-            if pos == -1:
-                return str(data)[:100] + "..."
-            
-            # Extraer contexto alrededor
-            start = max(0, pos - 50)
-            end = min(len(data_str), pos + len(query) + 50)
-            
-            snippet = data_str[start:end]
-            if start > 0:
-                snippet = "..." + snippet
-            if end < len(data_str):
-                snippet = snippet + "..."
+            for value in _iter_texts(data):
+                # Buscar la posición de la query
+                pos = value.lower().find(query_lower)
+                if pos == -1:
+                    continue
+                
+                # Extraer contexto alrededor
+                start = max(0, pos - 50)
+                end = min(len(value), pos + len(query) + 50)
                 
-            return snippet
+                snippet = value[start:end]
+                if start > 0:
+                    snippet = "..." + snippet
+                if end < len(value):
+                    snippet = snippet + "..."
+                
+                return snippet
+            
+            return _dumps(data)[:100] + "..."
             
-        except:
+        except (TypeError, ValueError):
             return str(data)[:100] + "..."
     
     def get_project_summary(self, project_name: str) -> Dict[str, Any]:
         """Obtiene un resumen del proyecto"""
-        all_context = self.get_project_info(project_name)
-        
         summary = {
             "project_name": project_name,
-            "context_types": list(set([ctx["type"] for ctx in all_context])),
-            "file_count": len([ctx for ctx in all_context if ctx["file_path"]]),
-            "last_activity": max([ctx["last_accessed"] for ctx in all_context]) if all_context else None,
-            "has_structure": any(ctx["type"] == "file_structure" for ctx in all_context),
-            "has_preferences": any(ctx["type"] == "user_preferences" for ctx in all_context)
+            "context_types": [],
+            "file_count": 0,
+            "last_activity": None,
+            "has_structure": False,
+            "has_preferences": False
         }
         
+        try:
+            with session_scope() as session:
+                if session is None:
+                    return summary
+                
+                # Un agregado por tipo de contexto en una sola consulta
+                rows = session.query(
+                    ProjectContext.context_type,
+                    func.count(ProjectContext.file_path),
+                    func.max(ProjectContext.last_accessed)
+                ).filter(
+                    ProjectContext.project_name == project_name
+                ).group_by(ProjectContext.context_type).all()
+        
+        except Exception as e:
+            print(f"❌ Error obteniendo resumen de proyecto: {e}")
+            return summary
+        
+        if rows:
+            summary["context_types"] = [context_type for context_type, _, _ in rows]
+            summary["file_count"] = sum(file_count for _, file_count, _ in rows)
+            summary["last_activity"] = max(last for _, _, last in rows).isoformat()
+            summary["has_structure"] = "file_structure" in summary["context_types"]
+            summary["has_preferences"] = "user_preferences" in summary["context_types"]
+        
         return summary
     
     def get_context_for_query(self, query: str, project_name: str = None) -> str:
@@ -234,28 +366,58 @@ class ContextManager:
         if project_name is None:
             project_name = self.current_project
         
-        # Buscar información específica del proyecto
-        project_info = self.get_project_info(project_name)
+        try:
+            with session_scope() as session:
+                if session is None:
+                    return ""
+                
+                columns = (
+                    ProjectContext.project_name,
+                    ProjectContext.context_type,
+                    ProjectContext.context_data,
+                    ProjectContext.last_accessed
+                )
+                
+                # Toda la información del proyecto actual y las 5 coincidencias más
+                # recientes en cualquier proyecto, en una sola consulta (UNION ALL);
+                # "own" < "search" fija el orden
+                own = select(literal("own").label("src"), *columns).where(
+                    ProjectContext.project_name == project_name
+                ).subquery()
+                
+                search_filter, params = self._search_filter(query)
+                related = select(literal("search").label("src"), *columns).where(
+                    search_filter
+                ).order_by(ProjectContext.last_accessed.desc()).limit(5).subquery()
+                
+                combined = union_all(select(own), select(related)).subquery()
+                rows = session.execute(
+                    select(combined).order_by(combined.c.src, combined.c.last_accessed.desc()),
+                    params
+                ).all()
         
-        # Buscar también en otros proyectos si la consulta lo amerita
-        search_results = self.search_project_context(query, limit=5)
+        except Exception as e:
+            print(f"❌ Error obteniendo contexto de proyecto: {e}")
+            return ""
         
-        if not project_info and not search_results:
+        if not rows:
             return ""
         
         context_parts = []
         context_parts.append(f"📁 Información del proyecto '{project_name}':")
         
-        # Información del proyecto actual
-        if project_info:
-            for info in project_info:
-                context_parts.append(f"   🔧 {info['type']}: {self._summarize_data(info['data'])}")
-        
-        # Resultados de búsqueda
-        if search_results:
-            context_parts.append("\n🔍 Información relacionada encontrada:")
-            for result in search_results:
-                context_parts.append(f"   📂 {result['project_name']} ({result['type']}): {result['relevance_snippet']}")
+        header_added = False
+        for src, row_project, context_type, context_data, _ in rows:
+            if src == "own":
+                # Información del proyecto actual
+                context_parts.append(f"   🔧 {context_type}: {self._summarize_data(context_data)}")
+            else:
+                # Resultados de búsqueda
+                if not header_added:
+                    context_parts.append("\n🔍 Información relacionada encontrada:")
+                    header_added = True
+                snippet = self._extract_relevant_snippet(context_data, query)
+                context_parts.append(f"   📂 {row_project} ({context_type}): {snippet}")
         
         context_parts.append("---")
         return "\n".join(context_parts)
@@ -272,6 +434,7 @@ class ContextManager:
                     keys = list(data.keys())[:3]
                     return f"Campos: {', '.join(keys)}"
             else:
-                return str(data)[:50] + "..." if len(str(data)) > 50 else str(data)
-        except:
+                text_value = data if isinstance(data, str) else str(data)
+                return text_value[:50] + "..." if len(text_value) > 50 else text_value
+        except (TypeError, ValueError):
             return "Datos estructurados" 
\ No newline at end of file
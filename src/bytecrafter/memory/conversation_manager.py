@@ -2,91 +2,186 @@
 Gestor de conversaciones para memoria persistente
 """
 
+import atexit
+import hashlib
 import uuid
 import json
 import re
 from datetime import datetime, timezone
 from typing import List, Dict, Any, Optional, Tuple
 
-from .database import get_session, Conversation, Message
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import database
+from .database import session_scope, Conversation, Message, MessageBlob
+
+# INSERT con soporte de ON CONFLICT DO NOTHING según el dialecto
+_BLOB_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+# Texto del mensaje: el blob compartido o, en mensajes antiguos, la columna en línea
+_MESSAGE_CONTENT = func.coalesce(MessageBlob.content, Message.content)
+
+# tool_name y result/error de los mensajes <tool_result> antiguos, en una sola pasada
+_TOOL_RESULT_RE = re.compile(
+    r"<tool_name>(?P<name>.*?)</tool_name>.*?"
+    r"(?:<result>(?P<result>.*?)</result>|<error>(?P<error>.*?)</error>)",
+    re.DOTALL
+)
 
 class ConversationManager:
     """Gestiona conversaciones persistentes y recuperación de memoria"""
     
+    # Mensajes pendientes a partir de los cuales se escribe sin esperar a leer el historial
+    FLUSH_EVERY = 8
+    
     def __init__(self):
         self.current_session_id = str(uuid.uuid4())
         self.current_conversation_id = None
+        # Escritura diferida: los mensajes se acumulan y flush() los inserta juntos
+        self._pending: List[Dict[str, Any]] = []
+        # Último message_order escrito por conversación; solo se consulta en la BD
+        # para conversaciones que este proceso no ha creado ni escrito todavía
+        self._order_counters: Dict[int, int] = {}
+        atexit.register(self.flush)
         
     def start_new_conversation(self, title: str = None, user_id: str = "default_user") -> Optional[int]:
         """Inicia una nueva conversación"""
-        session = get_session()
-        if session is None:
-            return None
+        # Los mensajes pendientes pertenecen a la conversación anterior
+        self.flush()
         
         try:
-            conversation = Conversation(
-                session_id=self.current_session_id,
-                user_id=user_id,
-                title=title or f"Conversación {datetime.now().strftime('%Y-%m-%d %H:%M')}",
-                status="active"
-            )
-            
-            session.add(conversation)
-            session.commit()
-            
-            self.current_conversation_id = conversation.id
+            with session_scope() as session:
+                if session is None:
+                    return None
+                
+                # RETURNING devuelve el id en la misma sentencia del INSERT
+                conversation_id = session.execute(
+                    insert(Conversation).values(
+                        session_id=self.current_session_id,
+                        user_id=user_id,
+                        title=title or f"Conversación {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+                        status="active"
+                    ).returning(Conversation.id)
+                ).scalar_one()
             
-            session.close()
-            return conversation.id
+            self.current_conversation_id = conversation_id
+            self._order_counters[conversation_id] = 0
+            return conversation_id
             
         except Exception as e:
             print(f"❌ Error creando conversación: {e}")
-            if session:
-                session.rollback()
-                session.close()
             return None
     
     def save_message(self, role: str, content: str, tool_name: str = None, 
                     tool_params: Dict = None, tool_result: str = None) -> bool:
-        """Guarda un mensaje en la conversación actual"""
+        """Guarda un mensaje en la conversación actual
+
+        El mensaje queda pendiente y se escribe con flush(), que se ejecuta antes de
+        leer el historial, cada FLUSH_EVERY mensajes y al salir del programa.
+        """
         if self.current_conversation_id is None:
             self.start_new_conversation()
         
-        session = get_session()
-        if session is None:
+        if self.current_conversation_id is None:
             return False
         
+        self._pending.append({
+            "conversation_id": self.current_conversation_id,
+            "role": role,
+            "content": content,
+            "tool_name": tool_name,
+            "tool_params": tool_params,
+            "tool_result": tool_result
+        })
+        
+        if len(self._pending) >= self.FLUSH_EVERY:
+            return self.flush()
+        return True
+    
+    def flush(self) -> bool:
+        """Escribe los mensajes pendientes con un único INSERT de varias filas y un commit"""
+        if not self._pending:
+            return True
+        
         try:
-            # Obtener el orden del próximo mensaje
-            last_message = session.query(Message).filter(
-                Message.conversation_id == self.current_conversation_id
-            ).order_by(Message.message_order.desc()).first()
-            
-            next_order = 1 if last_message is None else last_message.message_order + 1
+            with session_scope() as session:
+                if session is None:
+                    return False
+                
+                rows = self._pending
+                counters = dict(self._order_counters)
+                for row in rows:
+                    conversation_id = row["conversation_id"]
+                    last_order = counters.get(conversation_id)
+                    if last_order is None:
+                        last_order = session.query(func.max(Message.message_order)).filter(
+                            Message.conversation_id == conversation_id
+                        ).scalar() or 0
+                    counters[conversation_id] = row["message_order"] = last_order + 1
+                
+                if database.MESSAGE_BLOBS:
+                    rows, blobs = self._split_blobs(rows)
+                    blob_insert = _BLOB_INSERTS[session.get_bind().dialect.name]
+                    session.execute(
+                        blob_insert(MessageBlob).on_conflict_do_nothing(index_elements=["hash"]),
+                        blobs
+                    )
+                
+                session.execute(Message.__table__.insert(), rows)
             
-            message = Message(
-                conversation_id=self.current_conversation_id,
-                role=role,
-                content=content,
-                tool_name=tool_name,
-                tool_params=tool_params,
-                tool_result=tool_result,
-                message_order=next_order
-            )
+            # Los contadores solo avanzan si el INSERT se confirmó
+            self._order_counters = counters
+            self._pending = []
+            return True
             
-            session.add(message)
-            session.commit()
-            session.close()
+        except Exception as e:
+            print(f"❌ Error guardando mensajes: {e}")
+            return False
+    
+    def discard_last_message(self) -> bool:
+        """Deshace el último save_message de la conversación actual (p. ej. si el LLM falló)"""
+        if self._pending:
+            self._pending.pop()
+            return True
+        
+        conversation_id = self.current_conversation_id
+        if conversation_id is None:
+            return False
+        
+        try:
+            with session_scope() as session:
+                if session is None:
+                    return False
+                
+                last = session.query(Message).filter(
+                    Message.conversation_id == conversation_id
+                ).order_by(Message.message_order.desc()).first()
+                if last is None:
+                    return False
+                self._order_counters[conversation_id] = last.message_order - 1
+                session.delete(last)
             
             return True
             
         except Exception as e:
-            print(f"❌ Error guardando mensaje: {e}")
-            if session:
-                session.rollback()
-                session.close()
+            # El contador puede haber quedado desfasado: se vuelve a leer de la BD
+            self._order_counters.pop(conversation_id, None)
+            print(f"❌ Error deshaciendo mensaje: {e}")
             return False
     
+    @staticmethod
+    def _split_blobs(rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Sustituye el contenido de cada fila por su hash y devuelve los blobs distintos"""
+        blobs = {}
+        split_rows = []
+        for row in rows:
+            content_hash = hashlib.sha256(row["content"].encode("utf-8")).digest()
+            blobs.setdefault(content_hash, {"hash": content_hash, "content": row["content"]})
+            split_rows.append({**row, "content": None, "content_hash": content_hash})
+        return split_rows, list(blobs.values())
+    
     def get_conversation_history(self, conversation_id: int = None, 
                                limit: int = 50) -> List[Dict[str, Any]]:
         """Recupera el historial de una conversación"""
@@ -96,116 +191,120 @@ class ConversationManager:
         if conversation_id is None:
             return []
         
-        session = get_session()
-        if session is None:
-            return []
+        # El historial debe incluir los mensajes aún no escritos
+        self.flush()
         
         try:
-            messages = session.query(Message).filter(
-                Message.conversation_id == conversation_id
-            ).order_by(Message.message_order).limit(limit).all()
-            
-            history = []
-            for msg in messages:
-                # Limpiar mensajes de tool_result para que Gemini no se confunda
-                cleaned_content = self._clean_tool_result_for_gemini(msg.content)
+            with session_scope() as session:
+                if session is None:
+                    return []
                 
-                # Solo incluir campos que Gemini acepta - NO metadatos de herramientas
-                message_data = {
-                    "role": msg.role,
-                    "parts": [{"text": cleaned_content}]
-                }
+                # Solo las dos columnas necesarias, como filas (sin construir objetos Message)
+                # y en bloques: con PostgreSQL se usa un cursor del lado del servidor
+                rows = session.execute(
+                    select(Message.role, _MESSAGE_CONTENT).outerjoin(
+                        MessageBlob, MessageBlob.hash == Message.content_hash
+                    ).where(
+                        Message.conversation_id == conversation_id
+                    ).order_by(Message.message_order).limit(limit).execution_options(
+                        yield_per=256, stream_results=True
+                    )
+                )
                 
+                # Solo los campos que Gemini acepta; los mensajes de tool_result antiguos se limpian.
                 # Los metadatos (tool_name, tool_params, tool_result) solo se usan para BD
-                # NO se envían a Gemini
-                
-                history.append(message_data)
-            
-            session.close()
-            return history
+                return [
+                    {"role": role, "parts": [{"text": self._clean_tool_result_for_gemini(content)}]}
+                    for role, content in rows
+                ]
             
         except Exception as e:
             print(f"❌ Error recuperando historial: {e}")
-            if session:
-                session.close()
             return []
     
     def search_conversations(self, query: str, user_id: str = "default_user", 
                            limit: int = 10) -> List[Dict[str, Any]]:
         """Busca conversaciones por contenido"""
-        session = get_session()
-        if session is None:
-            return []
-        
         try:
-            # Buscar en mensajes que contengan la query
-            conversations = session.query(Conversation).join(Message).filter(
-                Conversation.user_id == user_id,
-                Message.content.ilike(f"%{query}%")
-            ).distinct().order_by(Conversation.updated_at.desc()).limit(limit).all()
-            
-            results = []
-            for conv in conversations:
-                # Obtener snippet relevante
-                relevant_message = session.query(Message).filter(
-                    Message.conversation_id == conv.id,
-                    Message.content.ilike(f"%{query}%")
-                ).first()
+            with session_scope() as session:
+                if session is None:
+                    return []
                 
-                results.append({
-                    "id": conv.id,
-                    "title": conv.title,
-                    "created_at": conv.created_at.isoformat(),
-                    "updated_at": conv.updated_at.isoformat(),
-                    "snippet": relevant_message.content[:200] + "..." if relevant_message else "",
-                    "status": conv.status
-                })
-            
-            session.close()
-            return results
+                # Cada texto distinto se busca una sola vez en message_blobs; los mensajes
+                # antiguos, en su columna content
+                pattern = f"%{query}%"
+                matching_blobs = select(MessageBlob.hash).where(MessageBlob.content.ilike(pattern))
+                
+                # Mensajes que contienen la query, numerados dentro de cada conversación:
+                # el primero (rn = 1) es el snippet, sin una consulta extra por conversación
+                matches = session.query(
+                    Message.conversation_id.label("conversation_id"),
+                    _MESSAGE_CONTENT.label("content"),
+                    func.row_number().over(
+                        partition_by=Message.conversation_id,
+                        order_by=Message.message_order
+                    ).label("rn")
+                ).outerjoin(
+                    MessageBlob, MessageBlob.hash == Message.content_hash
+                ).filter(
+                    or_(Message.content_hash.in_(matching_blobs), Message.content.ilike(pattern))
+                ).subquery()
+                
+                rows = session.query(Conversation, matches.c.content).join(
+                    matches, matches.c.conversation_id == Conversation.id
+                ).filter(
+                    Conversation.user_id == user_id,
+                    matches.c.rn == 1
+                ).order_by(Conversation.updated_at.desc()).limit(limit).all()
+                
+                results = []
+                for conv, snippet in rows:
+                    results.append({
+                        "id": conv.id,
+                        "title": conv.title,
+                        "created_at": conv.created_at.isoformat(),
+                        "updated_at": conv.updated_at.isoformat(),
+                        "snippet": snippet[:200] + "...",
+                        "status": conv.status
+                    })
+                
+                return results
             
         except Exception as e:
             print(f"❌ Error buscando conversaciones: {e}")
-            if session:
-                session.close()
             return []
     
     def get_recent_conversations(self, user_id: str = "default_user", 
                                limit: int = 10) -> List[Dict[str, Any]]:
         """Obtiene conversaciones recientes"""
-        session = get_session()
-        if session is None:
-            return []
-        
         try:
-            conversations = session.query(Conversation).filter(
-                Conversation.user_id == user_id,
-                Conversation.status == "active"
-            ).order_by(Conversation.updated_at.desc()).limit(limit).all()
-            
-            results = []
-            for conv in conversations:
-                # Contar mensajes
-                message_count = session.query(Message).filter(
-                    Message.conversation_id == conv.id
-                ).count()
+            with session_scope() as session:
+                if session is None:
+                    return []
                 
-                results.append({
-                    "id": conv.id,
-                    "title": conv.title,
-                    "created_at": conv.created_at.isoformat(),
-                    "updated_at": conv.updated_at.isoformat(),
-                    "message_count": message_count,
-                    "status": conv.status
-                })
-            
-            session.close()
-            return results
+                # Conversaciones y su número de mensajes en una sola consulta (GROUP BY)
+                rows = session.query(Conversation, func.count(Message.id)).outerjoin(
+                    Message, Message.conversation_id == Conversation.id
+                ).filter(
+                    Conversation.user_id == user_id,
+                    Conversation.status == "active"
+                ).group_by(Conversation.id).order_by(Conversation.updated_at.desc()).limit(limit).all()
+                
+                results = []
+                for conv, message_count in rows:
+                    results.append({
+                        "id": conv.id,
+                        "title": conv.title,
+                        "created_at": conv.created_at.isoformat(),
+                        "updated_at": conv.updated_at.isoformat(),
+                        "message_count": message_count,
+                        "status": conv.status
+                    })
+                
+                return results
             
         except Exception as e:
             print(f"❌ Error obteniendo conversaciones recientes: {e}")
-            if session:
-                session.close()
             return []
     
     def complete_conversation(self, summary: str = None) -> bool:
@@ -213,29 +312,24 @@ class ConversationManager:
         if self.current_conversation_id is None:
             return False
         
-        session = get_session()
-        if session is None:
-            return False
-        
         try:
-            conversation = session.query(Conversation).filter(
-                Conversation.id == self.current_conversation_id
-            ).first()
-            
-            if conversation:
-                conversation.status = "completed"
-                if summary:
-                    conversation.summary = summary
-                session.commit()
+            with session_scope() as session:
+                if session is None:
+                    return False
+                
+                conversation = session.query(Conversation).filter(
+                    Conversation.id == self.current_conversation_id
+                ).first()
+                
+                if conversation:
+                    conversation.status = "completed"
+                    if summary:
+                        conversation.summary = summary
             
-            session.close()
             return True
             
         except Exception as e:
             print(f"❌ Error completando conversación: {e}")
-            if session:
-                session.rollback()
-                session.close()
             return False
     
     def get_context_for_query(self, query: str, user_id: str = "default_user") -> str:
@@ -258,31 +352,18 @@ class ConversationManager:
     
     def _clean_tool_result_for_gemini(self, content: str) -> str:
         """Limpia mensajes de tool_result para que Gemini no se confunda con el XML"""
-        # Detectar si es un mensaje de tool_result
-        if "<tool_result>" in content and "</tool_result>" in content:
-            try:
-                # Extraer tool_name y result del XML
-                tool_name_match = re.search(r'<tool_name>(.*?)</tool_name>', content)
-                result_match = re.search(r'<result>(.*?)</result>', content, re.DOTALL)
-                error_match = re.search(r'<error>(.*?)</error>', content, re.DOTALL)
-                
-                if tool_name_match:
-                    tool_name = tool_name_match.group(1)
-                    
-                    if result_match:
-                        result = result_match.group(1)
-                        return f"Tool: {tool_name}\nResult: {result}"
-                    elif error_match:
-                        error = error_match.group(1)
-                        return f"Tool: {tool_name}\nError: {error}"
-                
-                # Si no se puede parsear, devolver el contenido original
-                return content
-            except:
-                return content
+        # Los mensajes nuevos ya se guardan limpios: solo los antiguos llevan el XML
+        if "<tool_result>" not in content:
+            return content
+        
+        match = _TOOL_RESULT_RE.search(content)
+        if match is None:
+            # Si no se puede parsear, devolver el contenido original
+            return content
         
-        # Si no es tool_result, devolver tal como está
-        return content
+        if match.group("result") is not None:
+            return f"Tool: {match.group('name')}\nResult: {match.group('result')}"
+        return f"Tool: {match.group('name')}\nError: {match.group('error')}"
 
     def convert_to_gemini_format(self, history: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Convierte historial de BD al formato esperado por Gemini"""
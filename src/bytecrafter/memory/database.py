@@ -4,16 +4,22 @@ Modelos de base de datos y configuración para el sistema de memoria
 
 import os
 import json
+from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, UniqueConstraint, ForeignKey
+from sqlalchemy import create_engine, desc, event, inspect, select, text, update, Column, Integer, String, Text, DateTime, Float, LargeBinary, UniqueConstraint, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import JSON
 from sqlalchemy.sql import func
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 # Base para todos los modelos
 Base = declarative_base()
 
@@ -25,6 +31,35 @@ ENABLE_MEMORY = os.getenv("ENABLE_MEMORY", "true").lower() == "true"
 engine = None
 SessionLocal = None
 
+# Cómo se busca en project_context: "fts5" (SQLite), "tsvector" (PostgreSQL)
+# o "ilike" (escaneo completo, si no se pudieron crear los índices)
+PROJECT_CONTEXT_SEARCH = "ilike"
+
+# Cómo se busca en learning_memory.key_pattern: "fts5" (SQLite) o "ilike"
+# (en PostgreSQL servido por un índice de trigramas)
+LEARNING_SEARCH = "ilike"
+
+# Si el contenido de los mensajes nuevos se guarda una sola vez en message_blobs
+# (False en SQLite con una tabla messages antigua, donde content sigue siendo NOT NULL)
+MESSAGE_BLOBS = False
+
+def _json_serializer(value: Any) -> str:
+    """JSON compacto para las columnas JSON
+
+    Sin espacios tras ',' y ':' y con UTF-8 literal en lugar de escapes \\uXXXX
+    (6 bytes por carácter): filas más pequeñas, y los textos no ASCII se pueden
+    buscar tal cual con ILIKE/FTS. orjson produce exactamente este formato.
+    """
+    if orjson:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+def _json_deserializer(value: str) -> Any:
+    """Lee las columnas JSON (orjson si está disponible)"""
+    if orjson:
+        return orjson.loads(value)
+    return json.loads(value)
+
 def get_json_type():
     """Retorna el tipo JSON apropiado según la base de datos"""
     if DATABASE_URL.startswith("postgresql"):
@@ -47,6 +82,9 @@ class Conversation(Base):
     
     # Relaciones
     messages = relationship("Message", back_populates="conversation", cascade="all, delete-orphan")
+    
+    # Listado de conversaciones recientes: filtro por usuario/estado y orden por fecha
+    __table_args__ = (Index('ix_conv_user_updated', 'user_id', 'status', 'updated_at'),)
 
 class Message(Base):
     """Modelo para almacenar mensajes individuales"""
@@ -55,7 +93,8 @@ class Message(Base):
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     role = Column(String(10), nullable=False)  # 'user' or 'model'
-    content = Column(Text, nullable=False)
+    content = Column(Text)  # Solo mensajes antiguos; los nuevos se leen de message_blobs
+    content_hash = Column(LargeBinary(32), index=True)  # SHA-256 del contenido
     tool_name = Column(String(50))
     tool_params = Column(JSON)
     tool_result = Column(Text)
@@ -64,6 +103,16 @@ class Message(Base):
     
     # Relaciones
     conversation = relationship("Conversation", back_populates="messages")
+    
+    # Historial ordenado y MAX(message_order) de una conversación
+    __table_args__ = (Index('ix_msg_conv_order', 'conversation_id', 'message_order'),)
+
+class MessageBlob(Base):
+    """Contenido de mensajes deduplicado: cada texto distinto se guarda una vez"""
+    __tablename__ = "message_blobs"
+    
+    hash = Column(LargeBinary(32), primary_key=True)
+    content = Column(Text, nullable=False)
 
 class ProjectContext(Base):
     """Modelo para almacenar contexto de proyectos"""
@@ -77,7 +126,11 @@ class ProjectContext(Base):
     last_accessed = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    __table_args__ = (UniqueConstraint('project_name', 'file_path', 'context_type'),)
+    # La restricción única ya sirve de índice para la búsqueda exacta de save_project_info
+    __table_args__ = (
+        UniqueConstraint('project_name', 'file_path', 'context_type'),
+        Index('ix_pc_name_access', 'project_name', 'last_accessed'),
+    )
 
 class LearningMemory(Base):
     """Modelo para almacenar aprendizajes y patrones"""
@@ -91,6 +144,14 @@ class LearningMemory(Base):
     usage_count = Column(Integer, default=1)
     last_used = Column(DateTime(timezone=True), server_default=func.now())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Un patrón por categoría: destino del INSERT ... ON CONFLICT de learn_pattern.
+    # Índice único (no restricción) para que también se cree en tablas ya existentes.
+    # El segundo sirve el orden por confianza y uso dentro de una categoría
+    __table_args__ = (
+        Index('ux_learning_category_pattern', 'category', 'key_pattern', unique=True),
+        Index('ix_lm_cat_conf_usage', 'category', desc('confidence_score'), desc('usage_count')),
+    )
 
 def init_database() -> bool:
     """Inicializa la base de datos y crea las tablas"""
@@ -101,16 +162,41 @@ def init_database() -> bool:
     
     try:
         # Crear engine
+        # insertmanyvalues_page_size: los INSERT de varias filas se envían en una sola sentencia
         if DATABASE_URL.startswith("sqlite"):
-            engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+            engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False},
+                                   insertmanyvalues_page_size=10000,
+                                   json_serializer=_json_serializer,
+                                   json_deserializer=_json_deserializer)
+            event.listen(engine, "connect", _configure_sqlite)
         else:
-            engine = create_engine(DATABASE_URL)
+            # Pool explícito: las conexiones (TCP + autenticación) se reutilizan entre llamadas;
+            # LIFO mantiene calientes las pocas conexiones que realmente se usan
+            engine = create_engine(
+                DATABASE_URL,
+                pool_size=10,
+                max_overflow=20,
+                pool_pre_ping=True,
+                pool_recycle=1800,
+                pool_use_lifo=True,
+                insertmanyvalues_page_size=10000,
+                json_serializer=_json_serializer,
+                json_deserializer=_json_deserializer
+            )
         
         # Crear session factory
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        # expire_on_commit=False: los objetos siguen siendo legibles tras el commit sin recargarlos
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
         
         # Crear tablas
         Base.metadata.create_all(bind=engine)
+        _migrate_messages_table()
+        _dedupe_learning_patterns()
+        # create_all no añade índices nuevos a tablas que ya existían
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        _create_search_indexes()
         
         print("✅ Base de datos de memoria inicializada correctamente")
         return True
@@ -119,6 +205,146 @@ def init_database() -> bool:
         print(f"❌ Error inicializando base de datos: {e}")
         return False
 
+def _configure_sqlite(dbapi_connection, connection_record):
+    """PRAGMAs por conexión: WAL y synchronous=NORMAL evitan un fsync por commit"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+def _migrate_messages_table():
+    """Adapta una tabla messages creada antes de message_blobs (create_all no altera tablas)"""
+    global MESSAGE_BLOBS
+    
+    columns = {c["name"]: c for c in inspect(engine).get_columns("messages")}
+    with engine.begin() as conn:
+        if "content_hash" not in columns:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN content_hash {}".format(
+                Message.__table__.c.content_hash.type.compile(dialect=engine.dialect)
+            )))
+        if not columns["content"]["nullable"] and engine.dialect.name == "postgresql":
+            conn.execute(text("ALTER TABLE messages ALTER COLUMN content DROP NOT NULL"))
+            columns["content"]["nullable"] = True
+    
+    # SQLite no puede quitar NOT NULL sin reconstruir la tabla: ahí se sigue guardando en línea
+    MESSAGE_BLOBS = columns["content"]["nullable"] and engine.dialect.name in ("postgresql", "sqlite")
+
+def _dedupe_learning_patterns():
+    """Fusiona los patrones repetidos antes de crear ux_learning_category_pattern
+
+    Las tablas anteriores al índice único pueden tener varias filas por
+    (category, key_pattern): se conserva la más reciente (id mayor) con la suma de
+    usos y la mayor confianza, y se borran las demás.
+    """
+    indexes = {index["name"] for index in inspect(engine).get_indexes("learning_memory")}
+    if "ux_learning_category_pattern" in indexes:
+        return
+    
+    with engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE learning_memory SET "
+            "usage_count = (SELECT SUM(d.usage_count) FROM learning_memory d "
+            "WHERE d.category = learning_memory.category AND d.key_pattern = learning_memory.key_pattern), "
+            "confidence_score = (SELECT MAX(d.confidence_score) FROM learning_memory d "
+            "WHERE d.category = learning_memory.category AND d.key_pattern = learning_memory.key_pattern) "
+            "WHERE id IN (SELECT MAX(id) FROM learning_memory GROUP BY category, key_pattern HAVING COUNT(*) > 1)"
+        ))
+        conn.execute(text(
+            "DELETE FROM learning_memory WHERE id NOT IN "
+            "(SELECT MAX(id) FROM learning_memory GROUP BY category, key_pattern)"
+        ))
+
+def _create_search_indexes():
+    """Índices para las búsquedas de texto (ILIKE '%query%' no puede usar un B-tree)
+
+    PostgreSQL: índices GIN de trigramas (pg_trgm) sobre message_blobs.content,
+    messages.content (mensajes antiguos) y learning_memory.key_pattern, e índice GIN
+    de texto completo sobre los valores del JSON de project_context.
+    SQLite: tablas FTS5 con tokenizador trigram sincronizadas por triggers.
+    Si no se pueden crear, las búsquedas siguen funcionando con un escaneo completo.
+    """
+    global PROJECT_CONTEXT_SEARCH, LEARNING_SEARCH
+    
+    try:
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_messages_content_trgm "
+                    "ON messages USING gin (content gin_trgm_ops)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_message_blobs_content_trgm "
+                    "ON message_blobs USING gin (content gin_trgm_ops)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_learning_key_pattern_trgm "
+                    "ON learning_memory USING gin (key_pattern gin_trgm_ops)"
+                ))
+                # Debe coincidir con la expresión de ContextManager.search_project_context
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_pc_data_fts ON project_context "
+                    "USING gin (jsonb_to_tsvector('simple', context_data::jsonb, '[\"all\"]'))"
+                ))
+            PROJECT_CONTEXT_SEARCH = "tsvector"
+        elif engine.dialect.name == "sqlite":
+            with engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'project_context_fts'"
+                )).first()
+                if not exists:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE project_context_fts USING fts5("
+                        "project_name, context_type, data, tokenize='trigram')"
+                    ))
+                    # Indexar lo que ya estaba guardado
+                    conn.execute(text(
+                        "INSERT INTO project_context_fts(rowid, project_name, context_type, data) "
+                        "SELECT id, project_name, context_type, context_data FROM project_context"
+                    ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS project_context_fts_ai AFTER INSERT ON project_context BEGIN "
+                    "INSERT INTO project_context_fts(rowid, project_name, context_type, data) "
+                    "VALUES (new.id, new.project_name, new.context_type, new.context_data); END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS project_context_fts_au AFTER UPDATE ON project_context BEGIN "
+                    "UPDATE project_context_fts SET project_name = new.project_name, "
+                    "context_type = new.context_type, data = new.context_data WHERE rowid = old.id; END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS project_context_fts_ad AFTER DELETE ON project_context BEGIN "
+                    "DELETE FROM project_context_fts WHERE rowid = old.id; END"
+                ))
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'learning_fts'"
+                )).first()
+                if not exists:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE learning_fts USING fts5(key_pattern, tokenize='trigram')"
+                    ))
+                    conn.execute(text(
+                        "INSERT INTO learning_fts(rowid, key_pattern) SELECT id, key_pattern FROM learning_memory"
+                    ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS learning_fts_ai AFTER INSERT ON learning_memory BEGIN "
+                    "INSERT INTO learning_fts(rowid, key_pattern) VALUES (new.id, new.key_pattern); END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS learning_fts_au AFTER UPDATE OF key_pattern ON learning_memory BEGIN "
+                    "UPDATE learning_fts SET key_pattern = new.key_pattern WHERE rowid = old.id; END"
+                ))
+                conn.execute(text(
+                    "CREATE TRIGGER IF NOT EXISTS learning_fts_ad AFTER DELETE ON learning_memory BEGIN "
+                    "DELETE FROM learning_fts WHERE rowid = old.id; END"
+                ))
+            PROJECT_CONTEXT_SEARCH = "fts5"
+            LEARNING_SEARCH = "fts5"
+    except Exception as e:
+        print(f"⚠️  Índices de búsqueda no disponibles: {e}")
+
 def get_session() -> Optional[Session]:
     """Obtiene una sesión de base de datos"""
     if not ENABLE_MEMORY or SessionLocal is None:
@@ -130,28 +356,48 @@ def get_session() -> Optional[Session]:
         print(f"❌ Error obteniendo sesión de BD: {e}")
         return None
 
-def test_connection() -> bool:
-    """Prueba la conexión a la base de datos"""
-    if not ENABLE_MEMORY:
-        return False
-    
+@contextmanager
+def session_scope() -> Iterator[Optional[Session]]:
+    """Sesión transaccional: commit al terminar, rollback si hay una excepción y cierre siempre
+
+    Produce None si la memoria está desactivada o la base de datos no se inicializó.
+    """
     session = get_session()
     if session is None:
-        return False
+        yield None
+        return
     
     try:
-        # Prueba simple
-        session.execute("SELECT 1")
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
         session.close()
+
+def test_connection() -> bool:
+    """Prueba la conexión a la base de datos
+
+    Ping explícito; en el uso normal pool_pre_ping ya valida cada conexión del pool.
+    """
+    if not ENABLE_MEMORY or engine is None:
+        return False
+    
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         return True
     except Exception as e:
         print(f"❌ Error en conexión de BD: {e}")
-        if session:
-            session.close()
         return False
 
-def cleanup_old_data(retention_days: int = 90) -> bool:
-    """Limpia datos antiguos basado en política de retención"""
+def cleanup_old_data(retention_days: int = 90, batch_size: int = 5000) -> bool:
+    """Limpia datos antiguos basado en política de retención
+
+    Las conversaciones se archivan en lotes de batch_size con un commit por lote,
+    para no bloquear la tabla a los demás escritores mientras dura la limpieza.
+    """
     if not ENABLE_MEMORY:
         return False
     
@@ -163,18 +409,25 @@ def cleanup_old_data(retention_days: int = 90) -> bool:
         from datetime import timedelta
         cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
         
-        # Marcar conversaciones viejas como archivadas
-        old_conversations = session.query(Conversation).filter(
-            Conversation.updated_at < cutoff_date,
-            Conversation.status == "active"
-        ).update({"status": "archived"})
-        
-        # Actualizar última acceso en contexto de proyectos
-        session.query(ProjectContext).filter(
-            ProjectContext.last_accessed < cutoff_date
-        ).update({"last_accessed": func.now()})
+        # Marcar conversaciones viejas como archivadas. En PostgreSQL las filas
+        # bloqueadas por otra transacción se saltan (SKIP LOCKED); SQLite lo ignora
+        old_conversations = 0
+        while True:
+            batch_ids = select(Conversation.id).where(
+                Conversation.updated_at < cutoff_date,
+                Conversation.status == "active"
+            ).order_by(Conversation.id).limit(batch_size).with_for_update(skip_locked=True)
+            
+            result = session.execute(
+                update(Conversation).where(Conversation.id.in_(batch_ids)).values(status="archived"),
+                execution_options={"synchronize_session": False}
+            )
+            session.commit()
+            
+            old_conversations += result.rowcount
+            if result.rowcount < batch_size:
+                break
         
-        session.commit()
         session.close()
         
         print(f"✅ Limpieza completada: {old_conversations} conversaciones archivadas")
@@ -185,4 +438,4 @@ def cleanup_old_data(retention_days: int = 90) -> bool:
         if session:
             session.rollback()
             session.close()
-        return False 
\ No newline at end of file
+        return False
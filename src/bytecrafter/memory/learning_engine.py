@@ -2,138 +2,346 @@
 Motor de aprendizaje para memoria persistente
 """
 
+import atexit
 import json
+import os
+import time
 from datetime import datetime, timezone
-from typing import Dict, Any, List, Optional, Union
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 
-from .database import get_session, LearningMemory
+from sqlalchemy import JSON, case, cast, func, literal_column, or_, select, text, union_all, update
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import database
+from .database import session_scope, LearningMemory
+
+# Extensión -> prefijo del patrón de archivo
+_EXT_MAP: Dict[str, str] = {
+    ext: prefix
+    for prefix, exts in (
+        ("text_file", (".txt", ".md", ".log")),
+        ("code_file", (".py", ".js", ".html", ".css")),
+        ("document", (".pdf", ".doc", ".docx")),
+        ("image", (".jpg", ".png", ".gif")),
+    )
+    for ext in exts
+}
+
+# Cabecera y cierre del bloque de contexto de get_context_for_query
+_CONTEXT_HEADER = "🧠 Aprendizajes relevantes:"
+_CONTEXT_FOOTER = "---"
+
+# INSERT con soporte de ON CONFLICT DO UPDATE según el dialecto
+_UPSERT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
+@lru_cache(maxsize=256)
+def _error_pattern(error_type: str, error_message: str) -> str:
+    """Clave de un error: tipo y los primeros 100 caracteres del mensaje"""
+    return f"{error_type}:{error_message[:100]}"
+
+def _pattern_filter(query: str):
+    """Condición "key_pattern contiene query"
+
+    En SQLite se resuelve con el índice FTS5 trigram (necesita al menos 3 caracteres);
+    en PostgreSQL el ILIKE lo sirve el índice GIN de trigramas.
+    """
+    if database.LEARNING_SEARCH == "fts5" and len(query) >= 3:
+        matching_ids = select(literal_column("rowid")).select_from(
+            text("learning_fts")
+        ).where(text("learning_fts MATCH :fts_query"))
+        # Entre comillas: la query es una frase literal, no sintaxis de FTS5
+        fts_query = '"' + query.replace('"', '""') + '"'
+        return LearningMemory.id.in_(matching_ids.params(fts_query=fts_query))
+    return LearningMemory.key_pattern.ilike(f"%{query}%")
+
+def _merge_json(dialect: str, current, new):
+    """Combina en SQL las claves de primer nivel de dos JSON (las nuevas ganan)
+
+    Misma semántica que {**current, **new} en todos los motores: sin mezcla recursiva
+    y un null nuevo se guarda como null (json_patch de SQLite haría ambas cosas).
+    """
+    if dialect == "postgresql":
+        return cast(cast(current, JSONB).op("||")(cast(new, JSONB)), JSON)
+    
+    # SQLite: claves de current que new no trae, más todas las de new
+    current_items = func.json_each(current).table_valued("key", "value", "type").alias("current_items")
+    new_items = func.json_each(new).table_valued("key", "value", "type").alias("new_items")
+    new_keys = func.json_each(new).table_valued("key").alias("new_keys")
+    items = union_all(
+        select(current_items.c.key, current_items.c.value, current_items.c.type).where(
+            current_items.c.key.not_in(select(new_keys.c.key))
+        ),
+        select(new_items.c.key, new_items.c.value, new_items.c.type)
+    ).subquery()
+    # json_each devuelve los objetos y listas como texto y los booleanos como 0/1:
+    # json() los marca de nuevo como JSON para que json_group_object no los altere
+    value = case(
+        (items.c.type.in_(("object", "array")), func.json(items.c.value)),
+        (items.c.type.in_(("true", "false", "null")), func.json(items.c.type)),
+        else_=items.c.value
+    )
+    return select(func.json_group_object(items.c.key, value)).scalar_subquery()
 
 class LearningEngine:
     """Motor de aprendizaje que recuerda patrones y soluciones"""
     
+    # Caché de get_learned_pattern: segundos de validez y número máximo de entradas
+    CACHE_TTL = 60
+    CACHE_MAX_ENTRIES = 512
+    # Lecturas acumuladas a partir de las cuales se escribe last_used
+    TOUCH_FLUSH_EVERY = 64
+    # Validez, en segundos, de la solución cacheada para cada error
+    ERROR_CACHE_TTL = 300
+    
     def __init__(self):
-        pass
+        # (category, pattern) -> (instante de carga, id o None, resultado o None)
+        self._pattern_cache: Dict[Tuple[str, str], Tuple[float, Optional[int], Optional[Dict[str, Any]]]] = {}
+        # ids leídos cuyo last_used aún no se ha escrito; flush() los actualiza juntos
+        self._pending_touches: Set[int] = set()
+        # clave del error -> (instante de carga, fila encontrada o None)
+        self._error_sol_cache: Dict[str, Tuple[float, Any]] = {}
+        atexit.register(self.flush)
     
     def learn_pattern(self, category: str, pattern: str, data: Dict[str, Any], 
                      confidence: float = 1.0) -> bool:
         """Aprende un patrón nuevo o refuerza uno existente"""
-        session = get_session()
-        if session is None:
-            return False
-        
+        self._pattern_cache.pop((category, pattern), None)
         try:
-            # Buscar si ya existe
-            existing = session.query(LearningMemory).filter(
-                LearningMemory.category == category,
-                LearningMemory.key_pattern == pattern
-            ).first()
-            
-            if existing:
-                # Reforzar aprendizaje existente
-                existing.usage_count += 1
-                existing.confidence_score = min(1.0, existing.confidence_score + 0.1)
-                existing.last_used = datetime.now(timezone.utc)
+            with session_scope() as session:
+                if session is None:
+                    return False
+                
+                dialect = session.get_bind().dialect.name
+                dialect_insert = _UPSERT_INSERTS.get(dialect)
+                if dialect_insert is not None:
+                    # Un solo INSERT ... ON CONFLICT DO UPDATE: sin lectura previa ni
+                    # carrera entre dos procesos que aprenden el mismo patrón a la vez
+                    stmt = dialect_insert(LearningMemory).values(
+                        category=category,
+                        key_pattern=pattern,
+                        learned_data=data,
+                        confidence_score=confidence
+                    )
+                    reinforced = LearningMemory.confidence_score + 0.1
+                    session.execute(stmt.on_conflict_do_update(
+                        index_elements=["category", "key_pattern"],
+                        set_={
+                            "usage_count": LearningMemory.usage_count + 1,
+                            "confidence_score": case((reinforced > 1.0, 1.0), else_=reinforced),
+                            "last_used": func.now(),
+                            "learned_data": _merge_json(
+                                dialect, LearningMemory.learned_data, stmt.excluded.learned_data
+                            )
+                        }
+                    ))
+                    return True
                 
-                # Combinar datos si es útil
-                if "examples" in existing.learned_data:
-                    if "examples" in data:
-                        existing.learned_data["examples"].extend(data["examples"])
-                        # Mantener solo los últimos 10 ejemplos
-                        existing.learned_data["examples"] = existing.learned_data["examples"][-10:]
+                # Buscar si ya existe
+                existing = session.execute(
+                    select(LearningMemory).where(
+                        LearningMemory.category == category,
+                        LearningMemory.key_pattern == pattern
+                    )
+                ).scalar_one_or_none()
+                
+                if existing:
+                    # Reforzar aprendizaje existente
+                    existing.usage_count += 1
+                    existing.confidence_score = min(1.0, existing.confidence_score + 0.1)
+                    existing.last_used = func.now()
+                    existing.learned_data = {**existing.learned_data, **data}
                 else:
-                    existing.learned_data.update(data)
-            else:
-                # Crear nuevo aprendizaje
-                learning = LearningMemory(
-                    category=category,
-                    key_pattern=pattern,
-                    learned_data=data,
-                    confidence_score=confidence
-                )
-                session.add(learning)
+                    # Crear nuevo aprendizaje
+                    learning = LearningMemory(
+                        category=category,
+                        key_pattern=pattern,
+                        learned_data=data,
+                        confidence_score=confidence
+                    )
+                    session.add(learning)
             
-            session.commit()
-            session.close()
             return True
             
         except Exception as e:
             print(f"❌ Error aprendiendo patrón: {e}")
-            if session:
-                session.rollback()
-                session.close()
             return False
     
     def get_learned_pattern(self, category: str, pattern: str) -> Optional[Dict[str, Any]]:
-        """Obtiene un patrón aprendido específico"""
-        session = get_session()
-        if session is None:
+        """Obtiene un patrón aprendido específico (cacheado durante CACHE_TTL segundos)
+
+        last_used no se escribe en cada lectura: se acumula y flush() lo actualiza
+        con un único UPDATE.
+        """
+        key = (category, pattern)
+        cached = self._pattern_cache.get(key)
+        if cached is None or time.monotonic() - cached[0] >= self.CACHE_TTL:
+            try:
+                with session_scope() as session:
+                    if session is None:
+                        return None
+                    
+                    row = session.execute(
+                        select(
+                            LearningMemory.id,
+                            LearningMemory.learned_data,
+                            LearningMemory.confidence_score,
+                            LearningMemory.usage_count
+                        ).where(
+                            LearningMemory.category == category,
+                            LearningMemory.key_pattern == pattern
+                        )
+                    ).first()
+                
+            except Exception as e:
+                print(f"❌ Error obteniendo patrón: {e}")
+                return None
+            
+            if row is None:
+                # También se cachea que no existe: learn_pattern invalida la entrada
+                cached = (time.monotonic(), None, None)
+            else:
+                cached = (time.monotonic(), row.id, {
+                    "pattern": pattern,
+                    "data": row.learned_data,
+                    "confidence": row.confidence_score,
+                    "usage_count": row.usage_count
+                })
+            if len(self._pattern_cache) >= self.CACHE_MAX_ENTRIES:
+                # Descartar la entrada más antigua (los dict conservan el orden de inserción)
+                self._pattern_cache.pop(next(iter(self._pattern_cache)))
+            self._pattern_cache[key] = cached
+        
+        _, learning_id, result = cached
+        if learning_id is None:
             return None
         
+        self._touch(learning_id)
+        return {**result, "last_used": datetime.now(timezone.utc).isoformat()}
+    
+    def _touch(self, learning_id: int):
+        """Anota el último uso de un patrón; se escribe en el próximo flush()"""
+        self._pending_touches.add(learning_id)
+        if len(self._pending_touches) >= self.TOUCH_FLUSH_EVERY:
+            self.flush()
+    
+    def flush(self) -> bool:
+        """Escribe el last_used de los patrones leídos con un único UPDATE"""
+        if not self._pending_touches:
+            return True
+        
         try:
-            learning = session.query(LearningMemory).filter(
-                LearningMemory.category == category,
-                LearningMemory.key_pattern == pattern
-            ).first()
-            
-            if learning:
-                # Actualizar último uso
-                learning.last_used = datetime.now(timezone.utc)
-                session.commit()
+            with session_scope() as session:
+                if session is None:
+                    return False
                 
-                result = {
-                    "pattern": learning.key_pattern,
-                    "data": learning.learned_data,
-                    "confidence": learning.confidence_score,
-                    "usage_count": learning.usage_count,
-                    "last_used": learning.last_used.isoformat()
-                }
-                
-                session.close()
-                return result
+                session.execute(
+                    update(LearningMemory).where(
+                        LearningMemory.id.in_(self._pending_touches)
+                    ).values(last_used=func.now()),
+                    execution_options={"synchronize_session": False}
+                )
             
-            session.close()
-            return None
+            self._pending_touches = set()
+            return True
             
         except Exception as e:
-            print(f"❌ Error obteniendo patrón: {e}")
-            if session:
-                session.close()
-            return None
+            print(f"❌ Error actualizando último uso de patrones: {e}")
+            return False
     
     def search_similar_patterns(self, category: str, query: str, 
                                limit: int = 5) -> List[Dict[str, Any]]:
         """Busca patrones similares en una categoría"""
-        session = get_session()
-        if session is None:
-            return []
-        
         try:
-            # Buscar patrones que contengan la query
-            learnings = session.query(LearningMemory).filter(
-                LearningMemory.category == category,
-                LearningMemory.key_pattern.ilike(f"%{query}%")
-            ).order_by(
-                LearningMemory.confidence_score.desc(),
-                LearningMemory.usage_count.desc()
-            ).limit(limit).all()
+            with session_scope() as session:
+                if session is None:
+                    return []
+                
+                # Buscar patrones que contengan la query; solo las columnas devueltas,
+                # como tuplas (sin construir objetos LearningMemory)
+                rows = session.execute(
+                    select(
+                        LearningMemory.key_pattern,
+                        LearningMemory.learned_data,
+                        LearningMemory.confidence_score,
+                        LearningMemory.usage_count,
+                        LearningMemory.last_used
+                    ).where(
+                        LearningMemory.category == category,
+                        _pattern_filter(query)
+                    ).order_by(
+                        LearningMemory.confidence_score.desc(),
+                        LearningMemory.usage_count.desc()
+                    ).limit(limit)
+                ).all()
+                
+                results = []
+                for pattern, data, confidence, usage_count, last_used in rows:
+                    results.append({
+                        "pattern": pattern,
+                        "data": data,
+                        "confidence": confidence,
+                        "usage_count": usage_count,
+                        "last_used": last_used.isoformat()
+                    })
+                
+                return results
             
-            results = []
-            for learning in learnings:
-                results.append({
-                    "pattern": learning.key_pattern,
-                    "data": learning.learned_data,
-                    "confidence": learning.confidence_score,
-                    "usage_count": learning.usage_count,
-                    "last_used": learning.last_used.isoformat()
-                })
+        except Exception as e:
+            print(f"❌ Error buscando patrones: {e}")
+            return []
+    
+    def _search_many_categories(self, categories: List[str], query: str,
+                                per_category_limit: int, total_limit: int) -> List[Dict[str, Any]]:
+        """Busca en varias categorías con una sola consulta (UNION ALL)
+
+        Cada categoría aporta como máximo per_category_limit patrones; el conjunto
+        se ordena por confianza y uso y se corta en total_limit.
+        """
+        try:
+            with session_scope() as session:
+                if session is None:
+                    return []
+                
+                columns = (
+                    LearningMemory.key_pattern,
+                    LearningMemory.learned_data,
+                    LearningMemory.confidence_score,
+                    LearningMemory.usage_count,
+                    LearningMemory.last_used
+                )
+                per_category = [
+                    select(*columns).where(
+                        LearningMemory.category == category,
+                        _pattern_filter(query)
+                    ).order_by(
+                        LearningMemory.confidence_score.desc(),
+                        LearningMemory.usage_count.desc()
+                    ).limit(per_category_limit).subquery()
+                    for category in categories
+                ]
+                combined = union_all(*(select(sub) for sub in per_category)).subquery()
+                rows = session.execute(
+                    select(combined).order_by(
+                        combined.c.confidence_score.desc(),
+                        combined.c.usage_count.desc()
+                    ).limit(total_limit)
+                ).all()
             
-            session.close()
-            return results
+            return [
+                {
+                    "pattern": pattern,
+                    "data": data,
+                    "confidence": confidence,
+                    "usage_count": usage_count,
+                    "last_used": last_used.isoformat()
+                }
+                for pattern, data, confidence, usage_count, last_used in rows
+            ]
             
         except Exception as e:
             print(f"❌ Error buscando patrones: {e}")
-            if session:
-                session.close()
             return []
     
     def learn_file_encoding_solution(self, filename: str, encoding: str, 
@@ -159,7 +367,9 @@ class LearningEngine:
     def learn_error_solution(self, error_type: str, error_message: str, 
                            solution: str, context: Dict[str, Any] = None) -> bool:
         """Aprende solución a un error específico"""
-        pattern = f"{error_type}:{error_message[:100]}"
+        pattern = _error_pattern(error_type, error_message)
+        # Un patrón nuevo puede ser ahora la mejor solución para cualquier error cacheado
+        self._error_sol_cache.clear()
         
         data = {
             "error_type": error_type,
@@ -172,17 +382,64 @@ class LearningEngine:
         return self.learn_pattern("error_solution", pattern, data)
     
     def get_error_solution(self, error_type: str, error_message: str) -> Optional[Dict[str, Any]]:
-        """Obtiene solución para un error"""
-        # Buscar patrón exacto primero
-        pattern = f"{error_type}:{error_message[:100]}"
-        exact_match = self.get_learned_pattern("error_solution", pattern)
+        """Obtiene solución para un error
+
+        Una sola consulta: el patrón exacto si existe y, si no, el mejor patrón
+        similar del mismo tipo de error. El resultado se cachea ERROR_CACHE_TTL segundos.
+        """
+        pattern = _error_pattern(error_type, error_message)
+        cached = self._error_sol_cache.get(pattern)
+        if cached is None or time.monotonic() - cached[0] >= self.ERROR_CACHE_TTL:
+            try:
+                with session_scope() as session:
+                    if session is None:
+                        return None
+                    
+                    is_exact = LearningMemory.key_pattern == pattern
+                    row = session.execute(
+                        select(
+                            LearningMemory.id,
+                            LearningMemory.key_pattern,
+                            LearningMemory.learned_data,
+                            LearningMemory.confidence_score,
+                            LearningMemory.usage_count,
+                            LearningMemory.last_used,
+                            is_exact.label("exact")
+                        ).where(
+                            LearningMemory.category == "error_solution",
+                            or_(is_exact, _pattern_filter(error_type))
+                        ).order_by(
+                            is_exact.desc(),
+                            LearningMemory.confidence_score.desc(),
+                            LearningMemory.usage_count.desc()
+                        ).limit(1)
+                    ).first()
+                
+            except Exception as e:
+                print(f"❌ Error obteniendo solución de error: {e}")
+                return None
+            
+            cached = (time.monotonic(), row)
+            if len(self._error_sol_cache) >= self.CACHE_MAX_ENTRIES:
+                self._error_sol_cache.pop(next(iter(self._error_sol_cache)))
+            self._error_sol_cache[pattern] = cached
         
-        if exact_match:
-            return exact_match
+        row = cached[1]
+        if row is None:
+            return None
         
-        # Buscar patrones similares
-        similar = self.search_similar_patterns("error_solution", error_type, limit=3)
-        return similar[0] if similar else None
+        last_used = row.last_used
+        if row.exact:
+            # Como en get_learned_pattern, usar el patrón exacto actualiza su último uso
+            self._touch(row.id)
+            last_used = datetime.now(timezone.utc)
+        return {
+            "pattern": row.key_pattern,
+            "data": row.learned_data,
+            "confidence": row.confidence_score,
+            "usage_count": row.usage_count,
+            "last_used": last_used.isoformat()
+        }
     
     def learn_user_pattern(self, pattern_type: str, pattern_data: Dict[str, Any]) -> bool:
         """Aprende patrones de comportamiento del usuario"""
@@ -196,126 +453,130 @@ class LearningEngine:
             query = f"{pattern_type}:"
             return self.search_similar_patterns("user_pattern", query, limit=10)
         else:
-            session = get_session()
-            if session is None:
-                return []
-            
             try:
-                learnings = session.query(LearningMemory).filter(
-                    LearningMemory.category == "user_pattern"
-                ).order_by(LearningMemory.usage_count.desc()).limit(20).all()
-                
-                results = []
-                for learning in learnings:
-                    results.append({
-                        "pattern": learning.key_pattern,
-                        "data": learning.learned_data,
-                        "confidence": learning.confidence_score,
-                        "usage_count": learning.usage_count
-                    })
-                
-                session.close()
-                return results
+                with session_scope() as session:
+                    if session is None:
+                        return []
+                    
+                    rows = session.execute(
+                        select(
+                            LearningMemory.key_pattern,
+                            LearningMemory.learned_data,
+                            LearningMemory.confidence_score,
+                            LearningMemory.usage_count
+                        ).where(
+                            LearningMemory.category == "user_pattern"
+                        ).order_by(LearningMemory.usage_count.desc()).limit(20).execution_options(yield_per=64)
+                    )
+                    
+                    results = []
+                    for pattern, data, confidence, usage_count in rows:
+                        results.append({
+                            "pattern": pattern,
+                            "data": data,
+                            "confidence": confidence,
+                            "usage_count": usage_count
+                        })
+                    
+                    return results
                 
             except Exception as e:
                 print(f"❌ Error obteniendo patrones de usuario: {e}")
-                if session:
-                    session.close()
                 return []
     
     def get_learning_summary(self) -> Dict[str, Any]:
         """Obtiene resumen de todo lo aprendido"""
-        session = get_session()
-        if session is None:
-            return {}
-        
         try:
-            # Estadísticas por categoría
-            categories = session.query(
-                LearningMemory.category,
-                session.query(LearningMemory.id).filter(
-                    LearningMemory.category == LearningMemory.category
-                ).count().label('count')
-            ).group_by(LearningMemory.category).all()
-            
-            # Top patrones más usados
-            top_patterns = session.query(LearningMemory).order_by(
-                LearningMemory.usage_count.desc()
-            ).limit(10).all()
-            
-            summary = {
-                "total_patterns": session.query(LearningMemory).count(),
-                "categories": {cat.category: cat.count for cat in categories},
-                "top_patterns": [
-                    {
-                        "category": p.category,
-                        "pattern": p.key_pattern,
-                        "usage_count": p.usage_count,
-                        "confidence": p.confidence_score
-                    }
-                    for p in top_patterns
-                ]
-            }
-            
-            session.close()
-            return summary
+            with session_scope() as session:
+                if session is None:
+                    return {}
+                
+                # Estadísticas por categoría en un solo GROUP BY; el total es su suma
+                categories = dict(session.query(
+                    LearningMemory.category,
+                    func.count(LearningMemory.id)
+                ).group_by(LearningMemory.category).all())
+                
+                # Top patrones más usados (sin learned_data, que no se muestra)
+                top_patterns = session.query(
+                    LearningMemory.category,
+                    LearningMemory.key_pattern,
+                    LearningMemory.usage_count,
+                    LearningMemory.confidence_score
+                ).order_by(
+                    LearningMemory.usage_count.desc()
+                ).limit(10).all()
+                
+                summary = {
+                    "total_patterns": sum(categories.values()),
+                    "categories": categories,
+                    "top_patterns": [
+                        {
+                            "category": category,
+                            "pattern": pattern,
+                            "usage_count": usage_count,
+                            "confidence": confidence
+                        }
+                        for category, pattern, usage_count, confidence in top_patterns
+                    ]
+                }
+                
+                return summary
             
         except Exception as e:
             print(f"❌ Error obteniendo resumen de aprendizaje: {e}")
-            if session:
-                session.close()
             return {}
     
     def get_context_for_query(self, query: str, category: str = None) -> str:
         """Obtiene contexto de aprendizajes relevantes para una consulta"""
+        # Con menos de 3 caracteres la búsqueda por subcadena recorre casi toda la tabla
+        # y apenas filtra: no aporta contexto útil
+        query = query.strip() if query else ""
+        if len(query) < 3:
+            return ""
+        
         if category:
             patterns = self.search_similar_patterns(category, query, limit=3)
         else:
-            # Buscar en todas las categorías
-            all_patterns = []
-            for cat in ["file_encoding", "error_solution", "user_pattern"]:
-                cat_patterns = self.search_similar_patterns(cat, query, limit=2)
-                all_patterns.extend(cat_patterns)
-            
-            # Ordenar por confianza y uso
-            patterns = sorted(all_patterns, 
-                            key=lambda x: (x["confidence"], x["usage_count"]), 
-                            reverse=True)[:5]
+            # Buscar en todas las categorías, ordenado por confianza y uso. Se piden todas
+            # las filas por categoría (2 x 3) para que, al quitar patrones repetidos en
+            # varias categorías, sigan quedando hasta 5
+            candidates = self._search_many_categories(
+                ["file_encoding", "error_solution", "user_pattern"], query,
+                per_category_limit=2, total_limit=6
+            )
+            seen = set()
+            patterns = []
+            for candidate in candidates:
+                if candidate["pattern"] not in seen:
+                    seen.add(candidate["pattern"])
+                    patterns.append(candidate)
+            patterns = patterns[:5]
         
         if not patterns:
             return ""
         
-        context_parts = []
-        context_parts.append("🧠 Aprendizajes relevantes:")
+        context_parts = [_CONTEXT_HEADER]
+        append = context_parts.append
         
         for pattern in patterns:
-            usage_info = f"({pattern['usage_count']} usos, {pattern['confidence']:.1f} confianza)"
-            context_parts.append(f"   🔹 {pattern['pattern']} {usage_info}")
+            data = pattern["data"]
+            append(f"   🔹 {pattern['pattern']} ({pattern['usage_count']} usos, {pattern['confidence']:.1f} confianza)")
             
             # Agregar información útil del aprendizaje
-            if "solution" in pattern["data"]:
-                context_parts.append(f"      Solución: {pattern['data']['solution'][:100]}...")
-            elif "encoding" in pattern["data"]:
-                context_parts.append(f"      Encoding: {pattern['data']['encoding']}")
+            solution = data.get("solution")
+            if solution is not None:
+                append(f"      Solución: {solution[:100]}...")
+            elif "encoding" in data:
+                append(f"      Encoding: {data['encoding']}")
         
-        context_parts.append("---")
+        append(_CONTEXT_FOOTER)
         return "\n".join(context_parts)
     
     def _extract_file_pattern(self, filename: str) -> str:
         """Extrae patrón de un nombre de archivo"""
-        import os
-        
-        # Obtener extensión
         _, ext = os.path.splitext(filename.lower())
-        
-        # Patrones comunes
-        if ext in ['.txt', '.md', '.log']:
-            return f"text_file{ext}"
-        elif ext in ['.py', '.js', '.html', '.css']:
-            return f"code_file{ext}"
-        elif ext in ['.pdf', '.doc', '.docx']:
-            return f"document{ext}"
-        elif ext in ['.jpg', '.png', '.gif']:
-            return f"image{ext}"
-        else:
-            return f"unknown{ext}" if ext else "no_extension" 
\ No newline at end of file
+        prefix = _EXT_MAP.get(ext)
+        if prefix:
+            return f"{prefix}{ext}"
+        return f"unknown{ext}" if ext else "no_extension"
@@ -1,48 +1,58 @@
 import os
+from functools import lru_cache
 from importlib import import_module
 
 from .llm_provider import BaseProvider, ProviderNotConfigured
 
-# Registro de proveedores soportados
+# Registro de proveedores soportados: (variable de entorno requerida, clase).
+# Sin esa variable el proveedor se descarta en la selección automática sin
+# importar su módulo ni su SDK; None = no requiere clave.
 _PROVIDER_CLASSES = {
-    "gemini": "bytecrafter.providers.gemini_provider.GeminiProvider",
-    "openai": "bytecrafter.providers.openai_provider.OpenAIProvider",
-    "groq": "bytecrafter.providers.groq_provider.GroqProvider",
-    "openrouter": "bytecrafter.providers.openrouter_provider.OpenRouterProvider",
-    "ollama": "bytecrafter.providers.ollama_provider.OllamaProvider",
+    "gemini": ("GEMINI_API_KEY", "bytecrafter.providers.gemini_provider.GeminiProvider"),
+    "openai": ("OPENAI_API_KEY", "bytecrafter.providers.openai_provider.OpenAIProvider"),
+    "groq": ("GROQ_API_KEY", "bytecrafter.providers.groq_provider.GroqProvider"),
+    "openrouter": ("OPENROUTER_API_KEY", "bytecrafter.providers.openrouter_provider.OpenRouterProvider"),
+    "ollama": (None, "bytecrafter.providers.ollama_provider.OllamaProvider"),
     # Placeholders for future providers
-    "vertex": "bytecrafter.providers.stub_provider.StubProvider",
-    "deepseek": "bytecrafter.providers.deepseek_provider.DeepSeekProvider",
-    "mistral": "bytecrafter.providers.mistral_provider.MistralProvider",
-    "xai": "bytecrafter.providers.xai_provider.XAIProvider",
+    "vertex": (None, "bytecrafter.providers.stub_provider.StubProvider"),
+    "deepseek": ("DEEPSEEK_API_KEY", "bytecrafter.providers.deepseek_provider.DeepSeekProvider"),
+    "mistral": ("MISTRAL_API_KEY", "bytecrafter.providers.mistral_provider.MistralProvider"),
+    "xai": ("XAI_API_KEY", "bytecrafter.providers.xai_provider.XAIProvider"),
 }
 
 
+@lru_cache(maxsize=None)
 def _load_class(path: str):
     module_name, class_name = path.rsplit(".", 1)
     module = import_module(module_name)
     return getattr(module, class_name)
 
 
+@lru_cache(maxsize=None)
+def _instantiate(name: str) -> BaseProvider | None:
+    """Create (once) the provider registered as `name`, or None if it is not configured."""
+    entry = _PROVIDER_CLASSES.get(name)
+    if not entry:
+        return None
+    cls = _load_class(entry[1])
+    try:
+        return cls()
+    except ProviderNotConfigured:
+        return None
+
+
 def _auto_select() -> BaseProvider:
     preferred = os.getenv("PREFERRED_LLM_PROVIDER", "auto").lower()
 
-    def instantiate(name: str):
-        path = _PROVIDER_CLASSES.get(name)
-        if not path:
-            return None
-        cls = _load_class(path)
-        try:
-            return cls()
-        except ProviderNotConfigured:
-            return None
-
     if preferred != "auto":
-        provider = instantiate(preferred)
+        provider = _instantiate(preferred)
         if provider:
             return provider
 
-    # Fallback: iterate in declared order
+    # Fallback: first configured provider in declared order. Candidates are tried one
+    # at a time: a provider whose key is set is waited on (its init errors propagate),
+    # and the keyless ones (e.g. the Ollama HTTP probe) only run once every
+    # higher-priority candidate has turned out to be unconfigured.
     for key in [
         "gemini",
         "openai",
@@ -54,10 +64,20 @@ def _auto_select() -> BaseProvider:
         "vertex",
         "xai",
     ]:
-        provider = instantiate(key)
+        env_var = _PROVIDER_CLASSES[key][0]
+        if env_var and not os.getenv(env_var):
+            continue
+        provider = _instantiate(key)
         if provider:
             return provider
     raise RuntimeError("No configured LLM provider found in environment variables.")
 
 
-current_provider: BaseProvider = _auto_select() 
\ No newline at end of file
+def __getattr__(name: str):
+    # `current_provider` is selected on first access (PEP 562) rather than at import
+    # time, so importing the package never loads provider SDKs or probes the network.
+    if name == "current_provider":
+        global current_provider
+        current_provider = _auto_select()
+        return current_provider
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,5 @@
 import os
 from typing import List, Dict, Any
-import requests
 
 from .llm_provider import BaseProvider, ProviderNotConfigured
 
@@ -14,30 +13,27 @@ class DeepSeekProvider(BaseProvider):
             raise ProviderNotConfigured("DEEPSEEK_API_KEY missing")
         self._api_key = api_key
         self._base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
+        self._session = self._http_session({"Authorization": f"Bearer {api_key}"})
 
-    def _chat(self, model: str, messages: List[Dict[str, str]], **kwargs):
+    def _chat(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs):
         url = f"{self._base_url.rstrip('/')}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self._api_key}",
-            "Content-Type": "application/json",
-        }
         payload = {
             "model": model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
         }
         payload.update(kwargs)
-        resp = requests.post(url, json=payload, headers=headers, timeout=60)
-        resp.raise_for_status()
-        return resp.json()
+        if stream:
+            # Server-sent events: one `data: {chunk}` frame per delta, then `data: [DONE]`
+            return self._iter_json_lines(self._post_stream(self._session, url, payload, timeout=60))
+        return self._post_json(self._session, url, payload, timeout=60)
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
+        messages = self._build_messages(history, system_instruction)
+        if stream:
+            return self._wrap(self._iter_deltas(self._chat(model=model_name, messages=messages, stream=True, **kwargs)))
         data = self._chat(model=model_name, messages=messages, **kwargs)
         text = data.get("choices", [{}])[0].get("message", {}).get("content", "")
         return self._wrap(text) 
\ No newline at end of file
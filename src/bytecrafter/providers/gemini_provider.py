@@ -1,10 +1,19 @@
 import os
+from functools import lru_cache
 from typing import List, Dict, Any
 import google.generativeai as genai
 
 from .llm_provider import BaseProvider, ProviderNotConfigured
 
 
+@lru_cache(maxsize=8)
+def _get_model(model_name: str, system_instruction: str | None):
+    """Build a GenerativeModel once per (model, system prompt); the prompt is the same every turn."""
+    if system_instruction:
+        return genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+    return genai.GenerativeModel(model_name=model_name)
+
+
 class GeminiProvider(BaseProvider):
     name = "gemini"
 
@@ -14,13 +23,16 @@ class GeminiProvider(BaseProvider):
             raise ProviderNotConfigured("GEMINI_API_KEY missing")
         genai.configure(api_key=api_key)
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("DEFAULT_GEMINI_MODEL", "gemini-1.5-flash")
-        if system_instruction:
-            model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+        if system_instruction is None or isinstance(system_instruction, str):
+            model = _get_model(model_name, system_instruction)
         else:
-            model = genai.GenerativeModel(model_name=model_name)
-        raw = model.generate_content(history, **kwargs)
+            # Content objects/lists are not hashable: build the model uncached
+            model = _get_model.__wrapped__(model_name, system_instruction)
+        raw = model.generate_content(history, stream=stream, **kwargs)
+        if stream:
+            return self._wrap(chunk.text for chunk in raw)
         text = raw.candidates[0].content.parts[0].text
         return self._wrap(text) 
\ No newline at end of file
@@ -19,15 +19,22 @@ class GroqProvider(BaseProvider):
         base_url = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
         if not api_key:
             raise ProviderNotConfigured("GROQ_API_KEY missing")
-        openai.api_key = api_key
-        openai.api_base = base_url
+        # Per-request credentials: the openai module globals are shared by every provider
+        self._api_key = api_key
+        self._api_base = base_url
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("GROQ_MODEL", "llama3-70b-8192")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
-        response = openai.ChatCompletion.create(model=model_name, messages=messages, **kwargs)
+        messages = self._build_messages(history, system_instruction)
+        response = openai.ChatCompletion.create(
+            model=model_name,
+            messages=messages,
+            stream=stream,
+            api_key=self._api_key,
+            api_base=self._api_base,
+            **kwargs,
+        )
+        if stream:
+            return self._wrap(self._iter_deltas(response))
         return self._wrap(response.choices[0].message.content) 
\ No newline at end of file
@@ -1,6 +1,19 @@
 from __future__ import annotations
 
-from typing import List, Dict, Any
+import json
+from functools import lru_cache
+from typing import List, Dict, Any, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+@lru_cache(maxsize=8)
+def _system_message(system_instruction: str) -> Dict[str, str]:
+    """Build the system message once per distinct prompt; it is identical on every turn."""
+    return {"role": "system", "content": system_instruction}
 
 
 class ProviderNotConfigured(Exception):
@@ -18,11 +31,13 @@ class BaseProvider:
     # ---------------------------------------------------------------------
     # Public API
     # ---------------------------------------------------------------------
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         """Generate a response from the model.
 
         `history` follows OpenAI-like format: list of {"role": "user|assistant|system", "content": str}.
-        Must return a dict with at least `content: str` field.
+        Must return a dict with at least `content: str` field. With `stream=True` the
+        request is still sent immediately, but `content` is None and `stream` is an
+        iterator yielding the text as it arrives.
         """
         raise NotImplementedError
 
@@ -33,10 +48,96 @@ class BaseProvider:
         """Validate that the provider can run. Should raise ProviderNotConfigured if not."""
         pass
 
+    @staticmethod
+    def _http_session(headers: Dict[str, str] | None = None):
+        """Return a keep-alive `requests.Session` that retries requests the server never processed.
+
+        Reusing one session per provider avoids a new TCP/TLS handshake on every call.
+        Chat completions are billed, non-idempotent POSTs, so only failed connections
+        and 429 rate-limit rejections are retried; read errors and 5xx responses,
+        after which the request may already have run upstream, are not.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(
+            total=2,
+            connect=2,
+            read=0,
+            other=0,
+            backoff_factor=0.3,
+            status_forcelist=[429],
+            allowed_methods=frozenset({"GET", "POST"}),
+        )
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+        if headers:
+            session.headers.update(headers)
+        return session
+
+    @staticmethod
+    def _post_json(session, url: str, payload: Dict[str, Any], timeout: float) -> Any:
+        """POST `payload` as JSON and return the decoded response body.
+
+        Uses orjson (when installed) for both directions; long histories make the
+        stdlib encoder a measurable cost on every call.
+        """
+        if orjson:
+            body = orjson.dumps(payload)
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        resp = session.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=timeout)
+        resp.raise_for_status()
+        return orjson.loads(resp.content) if orjson else resp.json()
+
+    @staticmethod
+    def _post_stream(session, url: str, payload: Dict[str, Any], timeout: float):
+        """POST `payload` asking for a streamed body; return the response once headers arrive."""
+        body = orjson.dumps(payload) if orjson else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        resp = session.post(url, data=body, headers={"Content-Type": "application/json"}, timeout=timeout, stream=True)
+        resp.raise_for_status()
+        return resp
+
+    @staticmethod
+    def _iter_json_lines(resp) -> Iterator[Any]:
+        """Decode a streamed body of SSE `data: {...}` frames or newline-delimited JSON."""
+        with resp:
+            for line in resp.iter_lines():
+                if line.startswith(b"data:"):
+                    line = line[5:].strip()
+                if not line or line.startswith(b":"):
+                    continue
+                if line == b"[DONE]":
+                    break
+                yield orjson.loads(line) if orjson else json.loads(line)
+
+    @staticmethod
+    def _iter_deltas(chunks: Iterable[Any]) -> Iterator[str]:
+        """Yield the text deltas of OpenAI-style `chat.completion.chunk` objects."""
+        for chunk in chunks:
+            choices = chunk["choices"] if isinstance(chunk, dict) else chunk.choices
+            if not choices:
+                continue
+            delta = choices[0]["delta"] if isinstance(choices[0], dict) else choices[0].delta
+            content = delta.get("content") if isinstance(delta, dict) else delta.content
+            if content:
+                yield content
+
     # ---------------------------------------------------------------------
     # Helper to standardise output
     # ---------------------------------------------------------------------
     @staticmethod
-    def _wrap(text: str) -> Dict[str, str]:
-        """Return response in normalised format."""
-        return {"content": text} 
\ No newline at end of file
+    def _build_messages(history: List[Dict[str, str]], system_instruction: str | None) -> List[Dict[str, str]]:
+        """Prepend the system prompt to `history` in OpenAI-like chat format."""
+        if not system_instruction:
+            return list(history)
+        return [_system_message(system_instruction), *history]
+
+    @staticmethod
+    def _wrap(text: str | Iterator[str]) -> Dict[str, Any]:
+        """Return response in normalised format (an iterator of text chunks when streaming)."""
+        if isinstance(text, str):
+            return {"content": text}
+        return {"content": None, "stream": text} 
\ No newline at end of file
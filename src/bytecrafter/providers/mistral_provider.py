@@ -22,12 +22,11 @@ class MistralProvider(BaseProvider):
             raise ProviderNotConfigured("MISTRAL_API_KEY missing")
         self._client = MistralClient(api_key=api_key)
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("MISTRAL_MODEL", "mistral-small-latest")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
+        messages = self._build_messages(history, system_instruction)
+        if stream:
+            return self._wrap(self._iter_deltas(self._client.chat_stream(model=model_name, messages=messages)))
         resp = self._client.chat(model=model_name, messages=messages)
         return self._wrap(resp.choices[0].message.content) 
\ No newline at end of file
@@ -12,19 +12,20 @@ class OllamaProvider(BaseProvider):
         # No API key required, just base URL reachability check (optional)
         base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
         self._url = base_url.rstrip("/")
-        # Optionally verify server is up
+        self._session = self._http_session()
+        # Optionally verify server is up (OLLAMA_SKIP_PROBE=1 skips the round-trip)
+        if os.getenv("OLLAMA_SKIP_PROBE") == "1":
+            return
         try:
-            requests.get(f"{self._url}/")
+            # Plain request, not the retrying session: a missing server should fail fast
+            requests.get(f"{self._url}/", timeout=1)
         except Exception as exc:  # pragma: no cover
             raise ProviderNotConfigured(f"Cannot connect to Ollama at {self._url}: {exc}")
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("OLLAMA_MODEL", "llama3:8b")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
+        messages = self._build_messages(history, system_instruction)
 
         payload = {
             "model": model_name,
@@ -32,7 +33,14 @@ class OllamaProvider(BaseProvider):
             "stream": False,
         }
         timeout = int(os.getenv("OLLAMA_TIMEOUT", "300"))
-        resp = requests.post(f"{self._url}/api/chat", json=payload, timeout=timeout)
-        resp.raise_for_status()
-        data = resp.json()
+        if stream:
+            # Ollama streams newline-delimited JSON objects, each with a piece of the message
+            payload["stream"] = True
+            resp = self._post_stream(self._session, f"{self._url}/api/chat", payload, timeout=timeout)
+            return self._wrap(
+                part["message"]["content"]
+                for part in self._iter_json_lines(resp)
+                if part.get("message", {}).get("content")
+            )
+        data = self._post_json(self._session, f"{self._url}/api/chat", payload, timeout=timeout)
         return self._wrap(data.get("message", {}).get("content", "")) 
\ No newline at end of file
@@ -18,17 +18,22 @@ class OpenAIProvider(BaseProvider):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ProviderNotConfigured("OPENAI_API_KEY missing")
-        openai.api_key = api_key
-        base_url = os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE")
-        if base_url:
-            openai.api_base = base_url
+        # Per-request credentials: the openai module globals are shared by every provider
+        self._api_key = api_key
+        self._api_base = os.getenv("OPENAI_BASE_URL") or os.getenv("OPENAI_API_BASE") or None
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
-        response = openai.ChatCompletion.create(model=model_name, messages=messages, **kwargs)
+        messages = self._build_messages(history, system_instruction)
+        response = openai.ChatCompletion.create(
+            model=model_name,
+            messages=messages,
+            stream=stream,
+            api_key=self._api_key,
+            api_base=self._api_base,
+            **kwargs,
+        )
+        if stream:
+            return self._wrap(self._iter_deltas(response))
         return self._wrap(response.choices[0].message.content) 
\ No newline at end of file
@@ -20,15 +20,22 @@ class OpenRouterProvider(BaseProvider):
         api_key = os.getenv("OPENROUTER_API_KEY")
         if not api_key:
             raise ProviderNotConfigured("OPENROUTER_API_KEY missing")
-        openai.api_key = api_key
-        openai.api_base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+        # Per-request credentials: the openai module globals are shared by every provider
+        self._api_key = api_key
+        self._api_base = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("OPENROUTER_MODEL", "mistralai/mistral-7b-instruct")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
-        response = openai.ChatCompletion.create(model=model_name, messages=messages, **kwargs)
+        messages = self._build_messages(history, system_instruction)
+        response = openai.ChatCompletion.create(
+            model=model_name,
+            messages=messages,
+            stream=stream,
+            api_key=self._api_key,
+            api_base=self._api_base,
+            **kwargs,
+        )
+        if stream:
+            return self._wrap(self._iter_deltas(response))
         return self._wrap(response.choices[0].message.content) 
\ No newline at end of file
@@ -18,15 +18,22 @@ class XAIProvider(BaseProvider):
         api_key = os.getenv("XAI_API_KEY")
         if not api_key:
             raise ProviderNotConfigured("XAI_API_KEY missing")
-        openai.api_key = api_key
-        openai.api_base = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")
+        # Per-request credentials: the openai module globals are shared by every provider
+        self._api_key = api_key
+        self._api_base = os.getenv("XAI_BASE_URL", "https://api.x.ai/v1")
 
-    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, **kwargs: Any):
+    def generate(self, history: List[Dict[str, str]], model_name: str | None = None, stream: bool = False, **kwargs: Any):
         system_instruction = kwargs.pop("system_instruction", None)
         model_name = model_name or os.getenv("XAI_MODEL", "grok-1")
-        messages = []
-        if system_instruction:
-            messages.append({"role": "system", "content": system_instruction})
-        messages.extend(history)
-        resp = openai.ChatCompletion.create(model=model_name, messages=messages, **kwargs)
+        messages = self._build_messages(history, system_instruction)
+        resp = openai.ChatCompletion.create(
+            model=model_name,
+            messages=messages,
+            stream=stream,
+            api_key=self._api_key,
+            api_base=self._api_base,
+            **kwargs,
+        )
+        if stream:
+            return self._wrap(self._iter_deltas(resp))
         return self._wrap(resp.choices[0].message.content) 
\ No newline at end of file
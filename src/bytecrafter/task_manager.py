@@ -4,7 +4,9 @@ Similar a la herramienta new_task de Cline para dividir tareas complejas.
 """
 
 import json
+import os
 import time
+from bisect import insort
 from typing import Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
@@ -21,7 +23,7 @@ class TaskPriority(Enum):
     HIGH = 3
     URGENT = 4
 
-@dataclass
+@dataclass(slots=True)
 class Task:
     id: str
     description: str
@@ -29,7 +31,7 @@ class Task:
     priority: TaskPriority
     created_at: float
     parent_task_id: Optional[str] = None
-    subtasks: List[str] = None
+    subtasks: Dict[str, None] = None  # ids en orden de creación (dict: pertenencia O(1), sin duplicados)
     progress: float = 0.0
     estimated_duration: Optional[int] = None
     tags: List[str] = None
@@ -37,10 +39,38 @@ class Task:
     
     def __post_init__(self):
         if self.subtasks is None:
-            self.subtasks = []
+            self.subtasks = {}
         if self.tags is None:
             self.tags = []
 
+# Iconos de estado y prioridad usados en los listados
+_STATUS_ICON = {
+    TaskStatus.PENDING: "⏳",
+    TaskStatus.IN_PROGRESS: "🔄",
+    TaskStatus.COMPLETED: "✅",
+    TaskStatus.FAILED: "❌"
+}
+
+_PRIORITY_ICON = {
+    TaskPriority.LOW: "🟢",
+    TaskPriority.MEDIUM: "🟡",
+    TaskPriority.HIGH: "🟠",
+    TaskPriority.URGENT: "🔴"
+}
+
+# Inicio de cada línea del listado, precalculado para las 16 combinaciones
+_LINE_PREFIX = {
+    (s, p): f"{_STATUS_ICON[s]} {_PRIORITY_ICON[p]} "
+    for s in TaskStatus for p in TaskPriority
+}
+
+# Prefijo de los IDs: el contador basta dentro del proceso; el PID distingue
+# los IDs de sesiones anteriores que puedan quedar en el historial
+_ID_PREFIX = f"task_{os.getpid()}_"
+
+# Prioridades de mayor a menor: orden en que list_tasks recorre los índices
+_PRIORITIES_DESC = sorted(TaskPriority, key=lambda p: p.value, reverse=True)
+
 class TaskManager:
     """Gestor de tareas para dividir trabajos complejos en subtareas manejables."""
     
@@ -48,119 +78,161 @@ class TaskManager:
         self.tasks: Dict[str, Task] = {}
         self.current_task_id: Optional[str] = None
         self.task_counter = 0
+        # Índices para listar sin recorrer ni ordenar todas las tareas. Cada lista está
+        # ordenada por (created_at, -secuencia, id): recorrida al revés da el mismo orden
+        # que ordenar por (prioridad, created_at) descendente
+        self._by_priority: Dict[TaskPriority, List[tuple]] = {p: [] for p in TaskPriority}
+        self._by_status: Dict[TaskStatus, Dict[TaskPriority, List[tuple]]] = {
+            s: {p: [] for p in TaskPriority} for s in TaskStatus
+        }
+        self._index_keys: Dict[str, tuple] = {}
+        # Versión del estado: cambia con cada tarea creada o modificada, y con ella
+        # quedan obsoletos los textos cacheados de list_tasks y get_current_task
+        self._version = 0
+        self._list_cache: Dict[Optional[TaskStatus], tuple] = {}
+        self._current_cache: Optional[tuple] = None
         
     def _generate_task_id(self) -> str:
-        """Genera un ID único para una tarea."""
+        """Genera un ID único para una tarea (no depende del reloj)."""
         self.task_counter += 1
-        return f"task_{int(time.time())}_{self.task_counter}"
+        return _ID_PREFIX + str(self.task_counter)
     
-    def create_task(self, description: str, priority: TaskPriority = TaskPriority.MEDIUM,
-                   parent_task_id: Optional[str] = None, tags: List[str] = None) -> str:
-        """Crea una nueva tarea."""
-        try:
-            task_id = self._generate_task_id()
-            
-            task = Task(
-                id=task_id,
-                description=description,
+    def _index_task(self, task: Task):
+        """Añade una tarea nueva a los índices de prioridad y estado."""
+        key = (task.created_at, -len(self._index_keys), task.id)
+        self._index_keys[task.id] = key
+        insort(self._by_priority[task.priority], key)
+        insort(self._by_status[task.status][task.priority], key)
+    
+    def _set_status(self, task: Task, status: TaskStatus):
+        """Cambia el estado de una tarea moviéndola de índice."""
+        if task.status == status:
+            return
+        key = self._index_keys[task.id]
+        self._by_status[task.status][task.priority].remove(key)
+        insort(self._by_status[status][task.priority], key)
+        task.status = status
+        self._version += 1
+    
+    def _create_task(self, description: str, priority: TaskPriority = TaskPriority.MEDIUM,
+                     parent_task_id: Optional[str] = None, tags: List[str] = None) -> Task:
+        """Crea y registra una tarea, devolviendo el objeto."""
+        now = time.time()
+        task_id = self._generate_task_id()
+        
+        task = Task(
+            id=task_id,
+            description=description,
+            status=TaskStatus.PENDING,
+            priority=priority,
+            created_at=now,
+            parent_task_id=parent_task_id,
+            tags=tags or []
+        )
+        
+        self.tasks[task_id] = task
+        self._index_task(task)
+        self._version += 1
+        
+        # Si es una subtarea, añadirla a la tarea padre
+        if parent_task_id and parent_task_id in self.tasks:
+            self.tasks[parent_task_id].subtasks[task_id] = None
+        
+        return task
+    
+    def _bulk_create(self, parent: Task, descriptions: List[str]) -> List[Task]:
+        """Crea de una vez las subtareas de `parent`, heredando su prioridad y tags."""
+        now = time.time()
+        base = self.task_counter
+        self.task_counter += len(descriptions)
+        priority, tags = parent.priority, parent.tags
+        
+        new_tasks = [
+            Task(
+                id=_ID_PREFIX + str(base + i),
+                description=desc,
                 status=TaskStatus.PENDING,
                 priority=priority,
-                created_at=time.time(),
-                parent_task_id=parent_task_id,
-                tags=tags or []
+                created_at=now,
+                parent_task_id=parent.id,
+                tags=tags.copy()
             )
-            
-            self.tasks[task_id] = task
-            
-            # Si es una subtarea, añadirla a la tarea padre
-            if parent_task_id and parent_task_id in self.tasks:
-                self.tasks[parent_task_id].subtasks.append(task_id)
-            
-            result = [
-                f"✅ Tarea creada: {description}",
-                f"🆔 ID: {task_id}",
-                f"⭐ Prioridad: {priority.name}"
-            ]
-            
-            if parent_task_id:
-                result.append(f"👆 Tarea padre: {parent_task_id}")
-            
-            if tags:
-                result.append(f"🏷️ Tags: {', '.join(tags)}")
-            
-            return "\n".join(result)
-            
-        except Exception as e:
-            return f"❌ Error creando tarea: {e}"
+            for i, desc in enumerate(descriptions, 1)
+        ]
+        
+        self.tasks.update({task.id: task for task in new_tasks})
+        for task in new_tasks:
+            self._index_task(task)
+        parent.subtasks.update(dict.fromkeys(task.id for task in new_tasks))
+        self._version += 1
+        
+        return new_tasks
+    
+    def create_task(self, description: str, priority: TaskPriority = TaskPriority.MEDIUM,
+                   parent_task_id: Optional[str] = None, tags: List[str] = None) -> str:
+        """Crea una nueva tarea."""
+        task_id = self._create_task(description, priority, parent_task_id, tags).id
+        
+        result = [
+            f"✅ Tarea creada: {description}",
+            f"🆔 ID: {task_id}",
+            f"⭐ Prioridad: {priority.name}"
+        ]
+        
+        if parent_task_id:
+            result.append(f"👆 Tarea padre: {parent_task_id}")
+        
+        if tags:
+            result.append(f"🏷️ Tags: {', '.join(tags)}")
+        
+        return "\n".join(result)
     
     def start_task(self, task_id: str) -> str:
         """Inicia una tarea específica."""
-        try:
-            if task_id not in self.tasks:
-                return f"❌ Tarea '{task_id}' no encontrada"
-            
-            task = self.tasks[task_id]
-            task.status = TaskStatus.IN_PROGRESS
-            self.current_task_id = task_id
-            
-            return f"🚀 Tarea iniciada: {task.description} (ID: {task_id})"
-            
-        except Exception as e:
-            return f"❌ Error iniciando tarea: {e}"
+        task = self.tasks.get(task_id)
+        if task is None:
+            return f"❌ Tarea '{task_id}' no encontrada"
+        
+        self._set_status(task, TaskStatus.IN_PROGRESS)
+        self.current_task_id = task_id
+        
+        return f"🚀 Tarea iniciada: {task.description} (ID: {task_id})"
     
     def complete_task(self, task_id: str, notes: str = "") -> str:
         """Marca una tarea como completada."""
-        try:
-            if task_id not in self.tasks:
-                return f"❌ Tarea '{task_id}' no encontrada"
-            
-            task = self.tasks[task_id]
-            task.status = TaskStatus.COMPLETED
-            task.progress = 100.0
-            
-            if notes:
-                task.notes = notes
-            
-            result = [
-                f"✅ Tarea completada: {task.description}",
-                f"🆔 ID: {task_id}"
-            ]
-            
-            if notes:
-                result.append(f"📋 Notas: {notes}")
-            
-            # Si era la tarea actual, limpiar
-            if self.current_task_id == task_id:
-                self.current_task_id = None
-            
-            return "\n".join(result)
-            
-        except Exception as e:
-            return f"❌ Error completando tarea: {e}"
+        task = self.tasks.get(task_id)
+        if task is None:
+            return f"❌ Tarea '{task_id}' no encontrada"
+        
+        self._set_status(task, TaskStatus.COMPLETED)
+        task.progress = 100.0
+        
+        if notes:
+            task.notes = notes
+        self._version += 1
+        
+        result = [
+            f"✅ Tarea completada: {task.description}",
+            f"🆔 ID: {task_id}"
+        ]
+        
+        if notes:
+            result.append(f"📋 Notas: {notes}")
+        
+        # Si era la tarea actual, limpiar
+        if self.current_task_id == task_id:
+            self.current_task_id = None
+        
+        return "\n".join(result)
     
     def break_down_task(self, task_id: str, subtask_descriptions: List[str]) -> str:
         """Divide una tarea en subtareas más pequeñas."""
         try:
-            if task_id not in self.tasks:
+            parent_task = self.tasks.get(task_id)
+            if parent_task is None:
                 return f"❌ Tarea '{task_id}' no encontrada"
             
-            parent_task = self.tasks[task_id]
-            created_subtasks = []
-            
-            for desc in subtask_descriptions:
-                result = self.create_task(
-                    description=desc,
-                    priority=parent_task.priority,
-                    parent_task_id=task_id,
-                    tags=parent_task.tags.copy()
-                )
-                # Extraer el ID de la respuesta
-                lines = result.split('\n')
-                for line in lines:
-                    if "ID: " in line:
-                        subtask_id = line.split("ID: ")[1]
-                        created_subtasks.append(subtask_id)
-                        break
+            created_subtasks = self._bulk_create(parent_task, subtask_descriptions)
             
             result = [
                 f"🔨 Tarea dividida: {parent_task.description}",
@@ -168,99 +240,91 @@ class TaskManager:
                 ""
             ]
             
-            for i, subtask_id in enumerate(created_subtasks, 1):
-                if subtask_id in self.tasks:
-                    subtask = self.tasks[subtask_id]
-                    result.append(f"  {i}. {subtask.description} (ID: {subtask_id})")
+            for i, subtask in enumerate(created_subtasks, 1):
+                result.append(f"  {i}. {subtask.description} (ID: {subtask.id})")
             
             return "\n".join(result)
             
-        except Exception as e:
+        except (KeyError, AttributeError) as e:
             return f"❌ Error dividiendo tarea: {e}"
     
     def list_tasks(self, status_filter: Optional[TaskStatus] = None) -> str:
         """Lista todas las tareas con filtros opcionales."""
-        try:
-            filtered_tasks = []
-            
-            for task in self.tasks.values():
-                if status_filter and task.status != status_filter:
-                    continue
-                filtered_tasks.append(task)
-            
-            if not filtered_tasks:
-                return "📭 No se encontraron tareas"
-            
-            # Ordenar por prioridad y fecha
-            filtered_tasks.sort(key=lambda t: (t.priority.value, t.created_at), reverse=True)
-            
-            result = [f"📋 Lista de tareas ({len(filtered_tasks)} encontradas):"]
-            
-            if status_filter:
-                result.append(f"🔍 Filtro estado: {status_filter.value}")
-            
-            result.append("")
-            
-            for task in filtered_tasks:
-                status_icon = {
-                    TaskStatus.PENDING: "⏳",
-                    TaskStatus.IN_PROGRESS: "🔄",
-                    TaskStatus.COMPLETED: "✅",
-                    TaskStatus.FAILED: "❌"
-                }.get(task.status, "❓")
-                
-                priority_icon = {
-                    TaskPriority.LOW: "🟢",
-                    TaskPriority.MEDIUM: "🟡", 
-                    TaskPriority.HIGH: "🟠",
-                    TaskPriority.URGENT: "🔴"
-                }.get(task.priority, "⚪")
-                
-                task_line = f"{status_icon} {priority_icon} {task.description} (ID: {task.id})"
-                
-                if task.progress > 0:
-                    task_line += f" - {task.progress}%"
-                
-                if task.subtasks:
-                    task_line += f" [{len(task.subtasks)} subtareas]"
-                
-                result.append(task_line)
-            
-            return "\n".join(result)
-            
-        except Exception as e:
-            return f"❌ Error listando tareas: {e}"
+        cached = self._list_cache.get(status_filter)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        
+        # Los índices ya están ordenados: por prioridad y, dentro de ella, por fecha
+        buckets = self._by_status[status_filter] if status_filter else self._by_priority
+        filtered_tasks = [
+            self.tasks[key[2]]
+            for priority in _PRIORITIES_DESC
+            for key in reversed(buckets[priority])
+        ]
+        
+        if not filtered_tasks:
+            output = "📭 No se encontraron tareas"
+            self._list_cache[status_filter] = (self._version, output)
+            return output
+        
+        result = [f"📋 Lista de tareas ({len(filtered_tasks)} encontradas):"]
+        
+        if status_filter:
+            result.append(f"🔍 Filtro estado: {status_filter.value}")
+        
+        result.append("")
+        
+        for task in filtered_tasks:
+            progress = f" - {task.progress}%" if task.progress > 0 else ""
+            subtasks = f" [{len(task.subtasks)} subtareas]" if task.subtasks else ""
+            result.append(
+                _LINE_PREFIX[(task.status, task.priority)]
+                + f"{task.description} (ID: {task.id}){progress}{subtasks}"
+            )
+        
+        output = "\n".join(result)
+        self._list_cache[status_filter] = (self._version, output)
+        return output
     
     def get_current_task(self) -> str:
         """Obtiene información de la tarea actual."""
-        try:
-            if not self.current_task_id:
-                return "📭 No hay tarea activa"
-            
-            task = self.tasks[self.current_task_id]
-            return f"🔄 Tarea actual: {task.description} (ID: {task.id}) - {task.progress}%"
-            
-        except Exception as e:
-            return f"❌ Error obteniendo tarea actual: {e}"
+        key = (self._version, self.current_task_id)
+        if self._current_cache is not None and self._current_cache[0] == key:
+            return self._current_cache[1]
+        
+        if not self.current_task_id:
+            return "📭 No hay tarea activa"
+        
+        task = self.tasks[self.current_task_id]
+        output = f"🔄 Tarea actual: {task.description} (ID: {task.id}) - {task.progress}%"
+        self._current_cache = (key, output)
+        return output
 
 # Instancia global del gestor de tareas
 task_manager = TaskManager()
 
+# Texto recibido por las herramientas -> enum
+_PRIORITY_MAP = {
+    "low": TaskPriority.LOW,
+    "medium": TaskPriority.MEDIUM,
+    "high": TaskPriority.HIGH,
+    "urgent": TaskPriority.URGENT
+}
+
+_STATUS_MAP = {
+    "pending": TaskStatus.PENDING,
+    "in_progress": TaskStatus.IN_PROGRESS,
+    "completed": TaskStatus.COMPLETED,
+    "failed": TaskStatus.FAILED
+}
+
 def new_task(description: str, priority: str = "medium", parent_task_id: str = None, tags: str = None) -> str:
     """Crea una nueva tarea. Similar a la herramienta new_task de Cline."""
     try:
-        priority_map = {
-            "low": TaskPriority.LOW,
-            "medium": TaskPriority.MEDIUM,
-            "high": TaskPriority.HIGH,
-            "urgent": TaskPriority.URGENT
-        }
-        
-        priority_enum = priority_map.get(priority.lower(), TaskPriority.MEDIUM)
+        # Lo habitual es recibir ya el nombre canónico en minúsculas
+        priority_enum = _PRIORITY_MAP.get(priority) or _PRIORITY_MAP.get(priority.casefold(), TaskPriority.MEDIUM)
         
-        tags_list = []
-        if tags:
-            tags_list = [tag.strip() for tag in tags.split(",")]
+        tags_list = [tag for tag in map(str.strip, tags.split(",")) if tag] if tags else []
         
         return task_manager.create_task(
             description=description,
@@ -269,7 +333,7 @@ def new_task(description: str, priority: str = "medium", parent_task_id: str = N
             tags=tags_list
         )
         
-    except Exception as e:
+    except (KeyError, AttributeError) as e:
         return f"❌ Error creando nueva tarea: {e}"
 
 def start_task_work(task_id: str) -> str:
@@ -289,10 +353,10 @@ def break_down_current_task(subtask_descriptions: str) -> str:
         return "❌ No hay tarea activa para dividir"
     
     try:
-        subtasks = [desc.strip() for desc in subtask_descriptions.split(",")]
+        subtasks = [desc for desc in map(str.strip, subtask_descriptions.split(",")) if desc]
         return task_manager.break_down_task(task_manager.current_task_id, subtasks)
         
-    except Exception as e:
+    except (KeyError, AttributeError) as e:
         return f"❌ Error dividiendo tarea: {e}"
 
 def show_task_list(status: str = None) -> str:
@@ -300,17 +364,11 @@ def show_task_list(status: str = None) -> str:
     try:
         status_enum = None
         if status:
-            status_map = {
-                "pending": TaskStatus.PENDING,
-                "in_progress": TaskStatus.IN_PROGRESS,
-                "completed": TaskStatus.COMPLETED,
-                "failed": TaskStatus.FAILED
-            }
-            status_enum = status_map.get(status.lower())
+            status_enum = _STATUS_MAP.get(status) or _STATUS_MAP.get(status.casefold())
         
         return task_manager.list_tasks(status_enum)
         
-    except Exception as e:
+    except (KeyError, AttributeError) as e:
         return f"❌ Error mostrando lista de tareas: {e}"
 
 def show_current_task() -> str:
@@ -1153,14 +1153,29 @@ def attempt_completion(result: str) -> str:
     # This function's output is handled specially in main.py.
     return f"Task completed. Result: {result}"
 
-# Importar funciones de módulos especializados
-from bytecrafter.browser_tools import (
-    start_browser_session, navigate_browser, take_browser_screenshot, close_browser_session
-)
-from bytecrafter.task_manager import (
-    new_task, start_task_work, complete_current_task, break_down_current_task, 
-    show_task_list, show_current_task
-)
+# Funciones de módulos especializados: se importan bajo demanda (PEP 562) para no
+# cargar requests/subprocess del navegador hasta que el agente use esas herramientas
+_LAZY_TOOLS = {
+    "start_browser_session": "bytecrafter.browser_tools",
+    "navigate_browser": "bytecrafter.browser_tools",
+    "take_browser_screenshot": "bytecrafter.browser_tools",
+    "close_browser_session": "bytecrafter.browser_tools",
+    "new_task": "bytecrafter.task_manager",
+    "start_task_work": "bytecrafter.task_manager",
+    "complete_current_task": "bytecrafter.task_manager",
+    "break_down_current_task": "bytecrafter.task_manager",
+    "show_task_list": "bytecrafter.task_manager",
+    "show_current_task": "bytecrafter.task_manager",
+}
+
+def __getattr__(name: str):
+    module_name = _LAZY_TOOLS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    func = getattr(import_module(module_name), name)
+    globals()[name] = func
+    return func
 
 # Declaraciones de las nuevas herramientas avanzadas
 replace_in_file_declaration = genai.protos.FunctionDeclaration(
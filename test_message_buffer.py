@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para la escritura diferida de mensajes (ConversationManager)
+y el almacenamiento compartido de textos en message_blobs
+"""
+
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# Base de datos SQLite temporal: debe configurarse antes de importar la memoria
+_DB_DIR = tempfile.mkdtemp(prefix="bytecrafter_test_")
+atexit.register(shutil.rmtree, _DB_DIR, ignore_errors=True)
+os.environ["ENABLE_MEMORY"] = "true"
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'memory.db')}"
+
+# Añadir el directorio src al path para poder importar bytecrafter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sqlalchemy import func, select
+
+from bytecrafter.memory import init_database, ConversationManager
+from bytecrafter.memory import database
+from bytecrafter.memory.database import session_scope, Message, MessageBlob
+
+assert init_database(), "No se pudo inicializar la base de datos de prueba"
+
+def _stored_messages(conversation_id):
+    """(message_order, role, content_hash) de los mensajes ya escritos"""
+    with session_scope() as session:
+        return session.execute(
+            select(Message.message_order, Message.role, Message.content_hash)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.message_order)
+        ).all()
+
+def test_flush():
+    """Los mensajes quedan pendientes hasta flush() y se escriben en orden"""
+    print("🧪 Probando escritura diferida...")
+
+    manager = ConversationManager()
+    conversation_id = manager.start_new_conversation("Prueba de flush")
+    assert conversation_id
+
+    for i in range(3):
+        manager.save_message("user", f"mensaje {i}")
+    assert len(manager._pending) == 3
+    assert _stored_messages(conversation_id) == []
+
+    assert manager.flush()
+    assert manager._pending == []
+    assert [order for order, _, _ in _stored_messages(conversation_id)] == [1, 2, 3]
+
+    # Al llegar a FLUSH_EVERY mensajes pendientes se escribe sin llamar a flush()
+    for i in range(ConversationManager.FLUSH_EVERY):
+        manager.save_message("model", f"respuesta {i}")
+    assert manager._pending == []
+    assert len(_stored_messages(conversation_id)) == 3 + ConversationManager.FLUSH_EVERY
+    print("  ✓ Mensajes escritos en bloque y en orden")
+
+def test_blob_dedup():
+    """Un texto repetido se guarda una sola vez en message_blobs"""
+    print("🧪 Probando deduplicación de textos...")
+
+    if not database.MESSAGE_BLOBS:
+        print("  ⚠️  message_blobs desactivado (tabla messages antigua): prueba omitida")
+        return
+
+    manager = ConversationManager()
+    conversation_id = manager.start_new_conversation("Prueba de blobs")
+    text = "Texto repetido que solo debe guardarse una vez"
+    manager.save_message("user", text)
+    manager.save_message("user", text)
+    assert manager.flush()
+
+    # Otra conversación con el mismo texto reutiliza el blob
+    other = ConversationManager()
+    other.start_new_conversation("Otra conversación")
+    other.save_message("user", text)
+    assert other.flush()
+
+    hashes = {content_hash for _, _, content_hash in _stored_messages(conversation_id)}
+    assert len(hashes) == 1 and None not in hashes
+    with session_scope() as session:
+        blob_count = session.execute(
+            select(func.count()).select_from(MessageBlob).where(MessageBlob.hash.in_(hashes))
+        ).scalar_one()
+    assert blob_count == 1
+    print("  ✓ Un solo blob para el texto repetido")
+
+def test_history_round_trip():
+    """El historial devuelve los mensajes guardados, incluidos los aún pendientes"""
+    print("🧪 Probando recuperación del historial...")
+
+    manager = ConversationManager()
+    manager.start_new_conversation("Prueba de historial")
+    messages = [
+        ("user", "¿Qué es qrspace8?"),
+        ("model", "qrspace8 es un proyecto con archivos UTF-16"),
+        ("user", "¿Qué es qrspace8?"),
+    ]
+    for role, content in messages:
+        manager.save_message(role, content)
+
+    history = manager.get_conversation_history()
+    assert [(msg["role"], msg["parts"][0]["text"]) for msg in history] == messages, history
+    assert manager._pending == []
+
+    # La búsqueda encuentra el texto guardado en message_blobs
+    results = manager.search_conversations("archivos UTF-16")
+    assert any(result["title"] == "Prueba de historial" for result in results), results
+    print("  ✓ Historial y búsqueda coinciden con lo guardado")
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Pruebas del buffer de mensajes\n")
+
+    tests = [test_flush, test_blob_dedup, test_history_round_trip]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {test.__name__} falló: {e}")
+
+    if failed:
+        print(f"\n❌ {failed} prueba(s) fallaron")
+        return False
+    print("\n✅ ¡Todas las pruebas pasaron!")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
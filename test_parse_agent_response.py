@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Script de prueba para el parser de respuestas del agente (parse_agent_response)
+"""
+
+import os
+import sys
+
+# Añadir el directorio src al path para poder importar bytecrafter
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from bytecrafter.main import parse_agent_response
+
+def test_well_formed():
+    """Respuesta con thinking y una herramienta con parámetros"""
+    print("🧪 Probando respuesta bien formada...")
+
+    result = parse_agent_response(
+        "<thinking>Voy a leer el archivo</thinking>\n"
+        "<read_file>\n<path>src/app.py</path>\n</read_file>"
+    )
+    assert result == ("Voy a leer el archivo", "read_file", {"path": "src/app.py"}), result
+
+    # Sin herramienta: solo thinking
+    result = parse_agent_response("<thinking>Solo pienso</thinking>")
+    assert result == ("Solo pienso", None, {}), result
+
+    # Un <tool_result> repetido por el modelo no se toma como herramienta
+    result = parse_agent_response(
+        "<thinking>t</thinking><tool_result><x>1</x></tool_result><list_files><path>.</path></list_files>"
+    )
+    assert result == ("t", "list_files", {"path": "."}), result
+    print("  ✓ Thinking, herramienta y parámetros extraídos")
+
+def test_fenced():
+    """Respuesta envuelta en un bloque de código markdown"""
+    print("🧪 Probando respuesta dentro de ```xml ...```...")
+
+    result = parse_agent_response(
+        "```xml\n<thinking>Listar</thinking>\n"
+        "<list_files><path>.</path><recursive>true</recursive></list_files>\n```"
+    )
+    assert result == ("Listar", "list_files", {"path": ".", "recursive": "true"}), result
+    print("  ✓ Las marcas de bloque se ignoran")
+
+def test_malformed():
+    """XML mal formado: el parser devuelve None"""
+    print("🧪 Probando respuestas mal formadas...")
+
+    # Parámetro sin cerrar
+    assert parse_agent_response("<thinking>x</thinking><read_file><path>a.py</read_file>") is None
+    # Herramienta sin cerrar
+    assert parse_agent_response("<thinking>x</thinking><read_file><path>a.py</path>") is None
+    # Thinking sin cerrar
+    assert parse_agent_response("<thinking>x<read_file><path>a.py</path></read_file>") is None
+    print("  ✓ Devuelven None")
+
+def test_entities():
+    """Las entidades se decodifican salvo en las etiquetas de texto libre"""
+    print("🧪 Probando entidades XML...")
+
+    result = parse_agent_response(
+        "<thinking>a &amp; b &lt; c</thinking>"
+        "<write_to_file><path>x&amp;y.txt</path><content>1 &lt; 2</content></write_to_file>"
+    )
+    assert result == ("a & b < c", "write_to_file", {"path": "x&y.txt", "content": "1 < 2"}), result
+
+    # command/result/question/answer se devuelven literales (pueden llevar & y < sin escapar)
+    result = parse_agent_response(
+        "<thinking>t</thinking><execute_command><command>ls && echo &amp;</command></execute_command>"
+    )
+    assert result == ("t", "execute_command", {"command": "ls && echo &amp;"}), result
+    print("  ✓ Entidades decodificadas donde corresponde")
+
+def main():
+    """Ejecuta todas las pruebas"""
+    print("🚀 Pruebas de parse_agent_response\n")
+
+    tests = [test_well_formed, test_fenced, test_malformed, test_entities]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+        except AssertionError as e:
+            failed += 1
+            print(f"  ❌ {test.__name__} falló: {e}")
+
+    if failed:
+        print(f"\n❌ {failed} prueba(s) fallaron")
+        return False
+    print("\n✅ ¡Todas las pruebas pasaron!")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)